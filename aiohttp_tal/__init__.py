@@ -1,30 +1,53 @@
 import asyncio
 import functools
+import time
 import warnings
+import weakref
 from collections.abc import Mapping
-from aiohttp import web
+import chameleon
+from aiohttp import hdrs, web
 from aiohttp.abc import AbstractView
+from .cache import conditional_response, default_cache_key, etag_matches, make_etag, not_modified, ResponseCache, SAFE_METHODS, version_etag
+from .compression import compress_response
 from .exceptions import TemplateNotFound
-from .helpers import GLOBAL_HELPERS
-from .utils import app_function_wrapper, Environment
+from .helpers import make_helpers
+from .metrics import TemplateMetrics
+from .plan import html_content_type, RenderPlan
+from .preload import load_preload_header, send_early_hints
+from .process import ProcessRenderer
+from .processors import ContextProcessor, is_lazy, resolve_context, run_concurrently, run_lazy
+from .reload import TemplateWatcher
+from .static import setup_static
+from .utils import ByteStream, Environment, log, OutputStream, render_scope
 
 
-__all__ = ('Environment', 'setup', 'get_env', 'render_template', 'render_string', 'template')
+__all__ = ('ContextProcessor', 'Environment', 'ResponseCache', 'TemplateMetrics', 'TemplateWatcher', 'setup', 'get_env', 'render_template', 'render_string', 'render_template_async', 'render_string_async', 'setup_static', 'stream_template', 'template')
 
 
 APP_CONTEXT_PROCESSORS_KEY = 'aiohttp_tal_context_processors'
+APP_CONCURRENT_PROCESSORS_KEY = 'aiohttp_tal_concurrent_processors'
 APP_KEY = 'aiohttp_tal_environment'
+REQUEST_CACHE_LOOKUP_KEY = 'aiohttp_tal_cache_lookup'
 REQUEST_CONTEXT_KEY = 'aiohttp_tal_context'
+REQUEST_CONTEXT_SECONDS_KEY = 'aiohttp_tal_context_seconds'
+REQUEST_LAZY_PROCESSORS_KEY = 'aiohttp_tal_lazy_processors'
 
 
 def setup(app, *args, app_key=APP_KEY, context_processors=(),
+          concurrent_processors=False,
           filters=None, default_helpers=True, autoescape=True,
+          cache_size=128, cache_max_bytes=None, executor=None,
+          inline_threshold=4096,
+          processes=None, precompile=False, cache_dir=None, reload=False,
           **kwargs):
 
-    env = Environment(kwargs['loader'])
+    env = Environment(kwargs['loader'], cache_size=cache_size,
+                      cache_max_bytes=cache_max_bytes, executor=executor,
+                      inline_threshold=inline_threshold,
+                      cache_dir=cache_dir)
 
     if default_helpers:
-        env.globals.update({k: app_function_wrapper(app, v) for k,v in GLOBAL_HELPERS.items()})
+        env.globals.update(make_helpers(app))
     if filters is not None:
         env.filters.update(filters)
 
@@ -32,18 +55,89 @@ def setup(app, *args, app_key=APP_KEY, context_processors=(),
 
     if context_processors:
         app[APP_CONTEXT_PROCESSORS_KEY] = context_processors
+        app[APP_CONCURRENT_PROCESSORS_KEY] = concurrent_processors
         app.middlewares.append(context_processors_middleware)
 
     env.globals['app'] = app
 
+    if processes is not None:
+        _setup_processes(app, env, processes)
+
+    if reload:
+        _setup_reload(app, env)
+
+    if precompile:
+        async def on_startup(app):
+            await env.precompile(executor=env.executor)
+
+        app.on_startup.append(on_startup)
+
+    # last, once the renderer of processes is known
+    _setup_plans(app, env, app_key)
+
     return env
 
 
+def _setup_processes(app, env, processes):
+    env.renderer = renderer = ProcessRenderer(
+        None if processes is True else processes)
+
+    async def on_startup(app):
+        renderer.start(app, env)
+
+    async def on_cleanup(app):
+        renderer.shutdown()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
+
+def _setup_reload(app, env):
+    if isinstance(env._loader, chameleon.PageTemplateLoader):
+        # the watcher invalidates changed templates instead
+        env._loader.kwargs['auto_reload'] = False
+    watcher = TemplateWatcher(env)
+
+    async def on_startup(app):
+        await watcher.start()
+
+    async def on_cleanup(app):
+        await watcher.stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
+
+def _route_handlers(app):
+    for route in app.router.routes():
+        handler = route.handler
+        if isinstance(handler, type) and issubclass(handler, AbstractView):
+            # methods of class based views
+            for method in hdrs.METH_ALL:
+                handler_method = getattr(handler, method.lower(), None)
+                if handler_method is not None:
+                    yield handler_method
+        else:
+            yield handler
+
+
+def _setup_plans(app, env, app_key):
+    async def on_startup(app):
+        # the application is frozen, handlers decorated with template do
+        # not look the environment and templates up on each request
+        for handler in _route_handlers(app):
+            build_plan = getattr(handler, 'build_render_plan', None)
+            if build_plan is not None and build_plan.app_key == app_key:
+                build_plan(app, env)
+
+    app.on_startup.append(on_startup)
+
+
 def get_env(app, *, app_key=APP_KEY):
     return app.get(app_key)
 
 
-def render_string(template_name, request, context, *, app_key=APP_KEY):
+def _get_env(request, app_key):
     env = request.config_dict.get(app_key)
     if env is None:
         text = ("Template engine is not initialized, "
@@ -53,47 +147,452 @@ def render_string(template_name, request, context, *, app_key=APP_KEY):
         # output and rendered page we add same message to *reason* and
         # *text* arguments.
         raise web.HTTPInternalServerError(reason=text, text=text)
+    return env
+
+
+def _not_found(template_name):
+    text = "Template '{}' not found".format(template_name)
+    return web.HTTPInternalServerError(reason=text, text=text)
+
+
+def _get_template(env, template_name, macro=None):
     try:
-        template = env.get_template(template_name)
+        if macro is None:
+            return env.get_template(template_name)
+        return env.get_macro(template_name, macro)
     except TemplateNotFound as e:
-        text = "Template '{}' not found".format(template_name)
-        raise web.HTTPInternalServerError(reason=text, text=text) from e
+        raise _not_found(e.name) from e
+
+
+def _fragment_name(template_name, macro):
+    # name of the output of a template or of one of its macros
+    if macro is None:
+        return template_name
+    return '{}#{}'.format(template_name, macro)
+
+
+def _get_context(request, context):
     if not isinstance(context, Mapping):
         text = "context should be mapping, not {}".format(type(context))
         # same reason as above
         raise web.HTTPInternalServerError(reason=text, text=text)
-    if request.get(REQUEST_CONTEXT_KEY):
-        context = dict(request[REQUEST_CONTEXT_KEY], **context)
-    text = template.render(**env.globals, **env.filters, **context)
-    return text
+    # context layers, later ones override earlier ones
+    request_context = request.get(REQUEST_CONTEXT_KEY)
+    if request_context:
+        return request_context, context
+    return context,
+
+
+def _prepare(template_name, request, context, app_key, macro=None):
+    env = _get_env(request, app_key)
+    template = _get_template(env, template_name, macro)
+    contexts = _get_context(request, context)
+    _check_lazy_processors(env, template_name, request)
+    _report_context(env, template_name, request)
+    return env, template, contexts
+
+
+def _check_lazy_processors(env, template_name, request):
+    # lazy processors cannot run from synchronous rendering functions
+    processors = request.pop(REQUEST_LAZY_PROCESSORS_KEY, None)
+    if not processors:
+        return
+    names = env.referenced_names(template_name)
+    if names is None:
+        return
+    missing = sorted(set().union(*(p.provides for p in processors)) & names)
+    if missing:
+        text = ("Template '{}' uses names of lazy context processors ({}), "
+                "render it with the template decorator or an asynchronous "
+                "rendering function".format(template_name,
+                                            ', '.join(missing)))
+        raise web.HTTPInternalServerError(reason=text, text=text)
+
+
+def _report_context(env, template_name, request):
+    # context processors ran before the template was known
+    seconds = request.pop(REQUEST_CONTEXT_SECONDS_KEY, None)
+    if seconds is not None:
+        env.instrument('context', template_name, seconds)
+
+
+async def _run_lazy_processors(env, template_name, request):
+    processors = request.pop(REQUEST_LAZY_PROCESSORS_KEY, None)
+    if processors:
+        start = time.perf_counter()
+        try:
+            names = env.referenced_names(template_name)
+        except TemplateNotFound:
+            # reported when rendering
+            return
+        await run_lazy(processors, request, request[REQUEST_CONTEXT_KEY],
+                       names)
+        request[REQUEST_CONTEXT_SECONDS_KEY] = (
+            request.get(REQUEST_CONTEXT_SECONDS_KEY, 0) +
+            time.perf_counter() - start)
+    _report_context(env, template_name, request)
+
+
+def _render(env, template_name, template, contexts, encoding=None):
+    start = time.perf_counter()
+    if encoding is None:
+        output = render_scope(template, env.namespace, contexts)
+        encode_seconds = None
+    else:
+        stream = ByteStream(encoding)
+        render_scope(template, env.namespace, contexts, stream)
+        stream.flush()
+        output = stream.buffer
+        encode_seconds = stream.encode_seconds
+    seconds = time.perf_counter() - start
+    size = len(output)
+    env.record_output_size(template_name, size)
+    if encode_seconds is None:
+        env.instrument('render', template_name, seconds, size)
+    else:
+        env.instrument('render', template_name, seconds - encode_seconds,
+                       size)
+        env.instrument('encode', template_name, encode_seconds, size)
+    return output
+
+
+def _make_response(body, encoding, status, content_type=None):
+    if content_type is None:
+        content_type = html_content_type(encoding)
+    return web.Response(body=body, status=status,
+                        headers={hdrs.CONTENT_TYPE: content_type})
+
+
+def render_string(template_name, request, context, *, app_key=APP_KEY,
+                  macro=None):
+    """Render a template, or only its macro named *macro*, to text."""
+    env, template, contexts = _prepare(template_name, request, context,
+                                       app_key, macro)
+    return _render(env, _fragment_name(template_name, macro), template,
+                   contexts)
+
+
+def _cached_response(request, template_name, cache, cache_key,
+                     version_tag, compress):
+    if version_tag is not None and etag_matches(request, version_tag):
+        return not_modified(version_tag)
+    if cache is not None and request.method in SAFE_METHODS:
+        key = (template_name, cache_key)
+        entry = cache.get(key)
+        if entry is not None:
+            response = entry.make_response()
+            if compress:
+                cache.compress_response(request, key, entry, response)
+            return conditional_response(request, response)
+    return None
+
+
+def _finish_response(request, response, template_name, cache, cache_key,
+                     etag, version_tag, compress):
+    if version_tag is not None:
+        response.headers[hdrs.ETAG] = version_tag
+    elif etag:
+        response.headers[hdrs.ETAG] = make_etag(response.body)
+    entry = None
+    if cache is not None and request.method in SAFE_METHODS:
+        key = (template_name, cache_key)
+        entry = cache.set(key, response)
+    if compress:
+        if entry is not None:
+            cache.compress_response(request, key, entry, response)
+        else:
+            compress_response(request, response)
+    return conditional_response(request, response)
 
 
 def render_template(template_name, request, context, *,
-                    app_key=APP_KEY, encoding='utf-8', status=200):
-    response = web.Response(status=status)
+                    app_key=APP_KEY, encoding='utf-8', status=200,
+                    cache=None, cache_key=None, etag=False, version=None,
+                    compress=False, macro=None):
+    """Render a template into a :class:`aiohttp.web.Response`.
+
+    With *macro* only the macro of this name is rendered, without the rest
+    of the template and its layout.
+
+    With a :class:`ResponseCache` as *cache*, the response is stored under
+    *cache_key*, by default the method and URL of the request, and later
+    calls with the same key skip rendering.
+
+    With *etag* the response gets an ``ETag`` computed from its body, or
+    from *version* when given, and a ``304 Not Modified`` response is
+    returned when it matches ``If-None-Match``. A matching *version* skips
+    rendering.
+
+    With *compress* the body is compressed as ``Accept-Encoding`` allows,
+    compressed bodies are cached along with the response in *cache*.
+    """
+    name = _fragment_name(template_name, macro)
+    if cache is not None and cache_key is None:
+        cache_key = default_cache_key(request)
+    version_tag = None
+    if version is not None:
+        version_tag = version_etag(name, version)
+    response = _cached_response(request, name, cache, cache_key,
+                                version_tag, compress)
+    if response is not None:
+        return response
     if context is None:
         context = {}
-    text = render_string(template_name, request, context, app_key=app_key)
+    env, template, contexts = _prepare(template_name, request, context,
+                                       app_key, macro)
+    body = _render(env, name, template, contexts, encoding)
+    response = _make_response(body, encoding, status)
+    return _finish_response(request, response, name, cache, cache_key, etag,
+                            version_tag, compress)
+
+
+async def render_string_async(template_name, request, context, *,
+                              app_key=APP_KEY, executor=None, macro=None):
+    """Render a template in an executor, off the event loop.
+
+    *executor* defaults to the one given to :func:`setup`, and then to the
+    loop default executor. Templates whose last output was shorter than
+    ``inline_threshold`` are rendered inline.
+
+    When :func:`setup` was given ``processes`` and no *executor* is passed,
+    the template is rendered in a worker process and *context* must be
+    picklable.
+    """
+    return await _render_async(template_name, request, context, app_key,
+                               executor, macro=macro)
+
+
+async def _render_async(template_name, request, context, app_key, executor,
+                        encoding=None, macro=None):
+    env = _get_env(request, app_key)
+    await _run_lazy_processors(env, template_name, request)
+    name = _fragment_name(template_name, macro)
+    if executor is None and env.renderer is not None:
+        contexts = _get_context(request, context)
+        start = time.perf_counter()
+        try:
+            output = await env.renderer.render(template_name, contexts,
+                                               encoding, macro)
+        except TemplateNotFound as e:
+            raise _not_found(e.name) from e
+        env.instrument('render', name, time.perf_counter() - start,
+                       len(output))
+        return output
+    template = _get_template(env, template_name, macro)
+    contexts = _get_context(request, context)
+    if env.render_inline(name):
+        return _render(env, name, template, contexts, encoding)
+    if executor is None:
+        executor = env.executor
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        executor, _render, env, name, template, contexts, encoding)
+
+
+async def render_template_async(template_name, request, context, *,
+                                app_key=APP_KEY, encoding='utf-8', status=200,
+                                executor=None, cache=None, cache_key=None,
+                                etag=False, version=None, compress=False,
+                                macro=None):
+    name = _fragment_name(template_name, macro)
+    if cache is not None and cache_key is None:
+        cache_key = default_cache_key(request)
+    version_tag = None
+    if version is not None:
+        version_tag = version_etag(name, version)
+    response = _cached_response(request, name, cache, cache_key,
+                                version_tag, compress)
+    if response is not None:
+        return response
+    if context is None:
+        context = {}
+    body = await _render_async(template_name, request, context, app_key,
+                               executor, encoding, macro)
+    response = _make_response(body, encoding, status)
+    return _finish_response(request, response, name, cache, cache_key, etag,
+                            version_tag, compress)
+
+
+async def stream_template(template_name, request, context, *,
+                          app_key=APP_KEY, encoding='utf-8', status=200,
+                          executor=None, chunk_size=65536, macro=None,
+                          preload=False, timeout=None, fallbacks=None):
+    """Render a template into a chunked :class:`aiohttp.web.StreamResponse`.
+
+    The template is rendered in an executor (see
+    :func:`render_string_async`), which writes every *chunk_size* characters
+    of output to the client while rendering.
+
+    The response is sent with the first chunk, so that errors before it
+    still give an error response. With *preload*, the headers are sent
+    before awaiting the awaitable values of *context* (see
+    :func:`template`), with ``Link`` headers for the static files of the
+    template, so that the client fetches them meanwhile. Errors once the
+    response is sent are logged and abort the connection.
+    """
+    if context is None:
+        context = {}
+    await _run_lazy_processors(_get_env(request, app_key), template_name,
+                               request)
+    env, template, contexts = _prepare(template_name, request, context,
+                                       app_key, macro)
+    name = _fragment_name(template_name, macro)
+    response = web.StreamResponse(status=status)
     response.content_type = 'text/html'
     response.charset = encoding
-    response.text = text
+    response.enable_chunked_encoding()
+    if preload:
+        link = await load_preload_header(env, template_name)
+        if link is not None:
+            response.headers[hdrs.LINK] = link
+            await response.prepare(request)
+
+    loop = asyncio.get_event_loop()
+
+    size = 0
+    write_seconds = 0
+
+    async def send(data):
+        if not response.prepared:
+            await response.prepare(request)
+        await response.write(data)
+
+    def write(data):
+        nonlocal size, write_seconds
+        start = time.perf_counter()
+        # wait for every chunk to be written, so a slow client throttles
+        # the rendering instead of buffering it
+        asyncio.run_coroutine_threadsafe(send(data), loop).result()
+        size += len(data)
+        write_seconds += time.perf_counter() - start
+
+    def render():
+        start = time.perf_counter()
+        stream = OutputStream(write, chunk_size, encoding)
+        render_scope(template, env.namespace, contexts, stream)
+        stream.flush()
+        seconds = time.perf_counter() - start - write_seconds
+        env.instrument('render', name, seconds - stream.encode_seconds, size)
+        env.instrument('encode', name, stream.encode_seconds, size)
+
+    if executor is None:
+        executor = env.executor
+    try:
+        resolved = await resolve_context(context, timeout=timeout,
+                                         fallbacks=fallbacks)
+        if resolved is not context:
+            contexts = _get_context(request, resolved)
+        await loop.run_in_executor(executor, render)
+    except Exception:
+        if not response.prepared:
+            raise
+        # the status is sent, closing the connection before the last chunk
+        # is the only way to tell the client the response is incomplete
+        log.exception("Error streaming template '%s'", name)
+        transport = request.transport
+        if transport is not None:
+            transport.abort()
+        return response
+    if not response.prepared:
+        await response.prepare(request)
+    await response.write_eof()
     return response
 
 
-def template(template_name, *, app_key=APP_KEY, encoding='utf-8', status=200):
+def template(template_name, *, app_key=APP_KEY, encoding='utf-8', status=200,
+             executor=None, stream=False, chunk_size=65536,
+             cache=None, cache_key=default_cache_key, etag=False,
+             version=None, compress=False, timeout=None, fallbacks=None,
+             macro=None, preload=False, early_hints=False):
+    """Render the context returned by the decorated handler.
+
+    Awaitable values of the context, such as coroutines, are awaited
+    concurrently before rendering, at most *timeout* seconds, using the
+    values of their keys in *fallbacks* when they fail or time out.
+
+    With *macro*, a macro name or a function of the request returning one
+    or ``None``, only this macro of the template is rendered.
+
+    With *preload* the response gets ``Link`` headers preloading the static
+    files of the template and of its layouts, and with *early_hints* they
+    are first sent in a ``103 Early Hints`` response, before calling the
+    handler.
+    """
 
     def wrapper(func):
+        is_coroutine = asyncio.iscoroutinefunction(func)
+        # application -> RenderPlan, once the application is frozen
+        plans = weakref.WeakKeyDictionary()
+
+        def build_plan(app, env):
+            plan = plans.get(app)
+            if plan is not None and plan.env is env:
+                return plan
+            plan = plans[app] = RenderPlan(env, template_name,
+                                           executor=executor,
+                                           encoding=encoding)
+            if not callable(macro):
+                # compile the template before the first request
+                try:
+                    plan.get_template(macro).cook_check()
+                except TemplateNotFound:
+                    # reported on request
+                    pass
+                except Exception as exc:
+                    # reported on request, as by precompile
+                    log.warning("Failed to compile template '%s': %r",
+                                template_name, exc)
+            if preload or early_hints:
+                # scan the sources before the first request
+                env.static_assets(template_name)
+            return plan
+
+        def get_plan(request):
+            app = request.app
+            plan = plans.get(app)
+            if plan is None:
+                env = _get_env(request, app_key)
+                if not app.frozen:
+                    return RenderPlan(env, template_name, executor=executor,
+                                      encoding=encoding)
+                plan = build_plan(app, env)
+            return plan
+
+        def lookup_response(request):
+            # cached response, or what the rendered one is stored under
+            macro_name = macro(request) if callable(macro) else macro
+            name = _fragment_name(template_name, macro_name)
+            response = None
+            response_cache = None
+            key = None
+            version_tag = None
+            if not stream:
+                if cache is not None and request.method in SAFE_METHODS:
+                    key = cache_key(request)
+                    if key is not None:
+                        response_cache = cache
+                if version is not None:
+                    version_tag = version_etag(name, version(request))
+                response = _cached_response(request, name, response_cache,
+                                            key, version_tag, compress)
+            return (response, macro_name, name, response_cache, key,
+                    version_tag)
+
+        def cached_response(request):
+            # looked up by the context processors middleware, so that hits
+            # skip context processors, and kept for the handler on misses
+            result = lookup_response(request)
+            request[REQUEST_CACHE_LOOKUP_KEY] = cached_response, result
+            return result[0]
+
         @functools.wraps(func)
         async def wrapped(*args):
-            if asyncio.iscoroutinefunction(func):
+            if is_coroutine:
                 coro = func
             else:
                 warnings.warn("Bare functions are deprecated, "
                               "use async ones", DeprecationWarning)
                 coro = asyncio.coroutine(func)
-            context = await coro(*args)
-            if isinstance(context, web.StreamResponse):
-                return context
 
             # Supports class based views see web.View
             if isinstance(args[0], AbstractView):
@@ -101,21 +600,128 @@ def template(template_name, *, app_key=APP_KEY, encoding='utf-8', status=200):
             else:
                 request = args[-1]
 
-            response = render_template(template_name, request, context,
-                                       app_key=app_key, encoding=encoding)
-            response.set_status(status)
-            return response
+            lookup = request.pop(REQUEST_CACHE_LOOKUP_KEY, None)
+            if lookup is None or lookup[0] is not cached_response:
+                lookup = cached_response, lookup_response(request)
+            (response, macro_name, name, response_cache, key,
+             version_tag) = lookup[1]
+            if response is not None:
+                return response
+
+            plan = get_plan(request)
+            env = plan.env
+            link = None
+            if preload or early_hints:
+                link = await load_preload_header(env, template_name)
+                if early_hints and link is not None:
+                    send_early_hints(request, link)
+
+            context = await coro(*args)
+            if isinstance(context, web.StreamResponse):
+                return context
+            if context is None:
+                context = {}
+
+            if stream:
+                # awaitables are resolved by stream_template, after sending
+                # the Link headers
+                return await stream_template(
+                    template_name, request, context, app_key=app_key,
+                    encoding=encoding, status=status, executor=executor,
+                    chunk_size=chunk_size, macro=macro_name,
+                    preload=preload, timeout=timeout, fallbacks=fallbacks)
+
+            if isinstance(context, Mapping):
+                context = await resolve_context(context, timeout=timeout,
+                                                fallbacks=fallbacks)
+
+            await _run_lazy_processors(env, template_name, request)
+            if plan.inline:
+                try:
+                    template = plan.get_template(macro_name)
+                except TemplateNotFound as e:
+                    raise _not_found(e.name) from e
+                contexts = _get_context(request, context)
+                _report_context(env, template_name, request)
+                body = _render(env, name, template, contexts, encoding)
+            else:
+                body = await _render_async(template_name, request, context,
+                                           app_key, executor, encoding,
+                                           macro_name)
+            response = _make_response(body, encoding, status,
+                                      plan.content_type)
+            if preload and link is not None:
+                response.headers[hdrs.LINK] = link
+            return _finish_response(request, response, name, response_cache,
+                                    key, etag, version_tag, compress)
+
+        # plans of the applications routing to it, see _setup_plans
+        build_plan.app_key = app_key
+        wrapped.build_render_plan = build_plan
+        if not stream and (cache is not None or version is not None):
+            # not when wrapped by other decorators, which may need it
+            cached_response.handler = wrapped
+            wrapped.cached_response = cached_response
         return wrapped
     return wrapper
 
 
+# frozen application -> (processors, lazy processors, concurrently)
+_processor_plans = weakref.WeakKeyDictionary()
+
+
+def _processor_plan(request):
+    app = request.app
+    plan = _processor_plans.get(app)
+    if plan is None:
+        config = request.config_dict
+        processors = []
+        lazy = []
+        for processor in config[APP_CONTEXT_PROCESSORS_KEY]:
+            (lazy if is_lazy(processor) else processors).append(processor)
+        plan = (processors, lazy,
+                bool(config.get(APP_CONCURRENT_PROCESSORS_KEY)))
+        if app.frozen:
+            _processor_plans[app] = plan
+    return plan
+
+
+def _match_handler(request):
+    handler = request.match_info.handler
+    if isinstance(handler, type) and issubclass(handler, AbstractView):
+        # methods of class based views
+        return getattr(handler, request.method.lower(), None)
+    return handler
+
+
 @web.middleware
 async def context_processors_middleware(request, handler):
 
+    match_handler = _match_handler(request)
+    cached_response = getattr(match_handler, 'cached_response', None)
+    if (cached_response is not None and
+            cached_response.handler is match_handler and
+            cached_response(request) is not None):
+        # answered from the cache of the handler, which does not need the
+        # context, inner middlewares still run
+        return await handler(request)
+
+    start = time.perf_counter()
     if REQUEST_CONTEXT_KEY not in request:
         request[REQUEST_CONTEXT_KEY] = {}
-    for processor in request.config_dict[APP_CONTEXT_PROCESSORS_KEY]:
-        request[REQUEST_CONTEXT_KEY].update(await processor(request))
+    context = request[REQUEST_CONTEXT_KEY]
+    processors, lazy, concurrently = _processor_plan(request)
+    if lazy:
+        # run before rendering if the template needs them
+        request.setdefault(REQUEST_LAZY_PROCESSORS_KEY, []).extend(lazy)
+    if concurrently:
+        # results are merged in order, later processors still win
+        for result in await run_concurrently(processors, request, context):
+            context.update(result)
+    else:
+        for processor in processors:
+            context.update(await processor(request))
+    request[REQUEST_CONTEXT_SECONDS_KEY] = time.perf_counter() - start
     return await handler(request)
 
 
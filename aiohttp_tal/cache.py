@@ -0,0 +1,150 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from aiohttp import hdrs, web
+from multidict import CIMultiDict
+
+from .compression import compress_response, strip_encoding
+
+
+# methods whose responses may be cached
+SAFE_METHODS = frozenset((hdrs.METH_GET, hdrs.METH_HEAD))
+
+
+def default_cache_key(request):
+    if request.method not in SAFE_METHODS:
+        return None
+    return request.method, request.rel_url.human_repr()
+
+
+def make_etag(data):
+    """Strong entity tag of *data* bytes."""
+    return '"{}"'.format(hashlib.blake2b(data, digest_size=16).hexdigest())
+
+
+def version_etag(template_name, version):
+    """Entity tag of a template rendered for a user supplied *version*."""
+    return make_etag('{}\0{}'.format(template_name, version).encode('utf-8'))
+
+
+def etag_matches(request, etag):
+    if request.method not in SAFE_METHODS:
+        return False
+    header = request.headers.get(hdrs.IF_NONE_MATCH)
+    if header is None:
+        return False
+    etag = strip_encoding(etag)
+    for value in header.split(','):
+        value = value.strip()
+        # If-None-Match uses the weak comparison
+        if value.startswith('W/'):
+            value = value[2:]
+        # compressed variants of a response share its entity tag
+        if value == '*' or strip_encoding(value) == etag:
+            return True
+    return False
+
+
+def not_modified(etag):
+    return web.Response(status=304, headers={hdrs.ETAG: etag})
+
+
+def conditional_response(request, response):
+    """Replace *response* by ``304 Not Modified`` when the client has it."""
+    etag = response.headers.get(hdrs.ETAG)
+    if etag is not None and etag_matches(request, etag):
+        return not_modified(etag)
+    return response
+
+
+class CachedResponse():
+    __slots__ = ('body', 'status', 'headers', 'expires', 'variants')
+
+    def __init__(self, body, status, headers, expires):
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.expires = expires
+        # compressed bodies by content coding
+        self.variants = {}
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+    def make_response(self):
+        return web.Response(body=self.body, status=self.status,
+                            headers=self.headers)
+
+
+class ResponseCache():
+    """Cache of rendered responses.
+
+    Stores the encoded body, status and headers of responses for *ttl*
+    seconds, evicting the least recently used ones when bodies take more
+    than *max_size* bytes.
+    """
+
+    def __init__(self, *, ttl=60, max_size=16 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            self.invalidate(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, response):
+        body = response.body
+        if not isinstance(body, (bytes, bytearray)):
+            # only rendered responses with a body are cached
+            return None
+        self.invalidate(key)
+        entry = CachedResponse(body, response.status,
+                               CIMultiDict(response.headers),
+                               time.monotonic() + self.ttl)
+        if entry.size > self.max_size:
+            return None
+        self._entries[key] = entry
+        self._size += entry.size
+        self._evict()
+        return entry
+
+    def _evict(self):
+        while self._size > self.max_size:
+            key, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+
+    def compress_response(self, request, key, entry, response):
+        """Compress *response*, keeping compressed bodies in *entry*."""
+        size = entry.size
+        compress_response(request, response, entry.variants)
+        if self._entries.get(key) is entry:
+            self._size += entry.size - size
+            self._evict()
+        return response
+
+    def invalidate(self, key=None):
+        """Drop a cached response, or all of them without arguments."""
+        if key is None:
+            self._entries.clear()
+            self._size = 0
+        else:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry.size
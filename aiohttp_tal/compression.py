@@ -0,0 +1,93 @@
+import zlib
+
+from aiohttp import hdrs
+
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+# by order of preference
+ENCODINGS = ('br', 'gzip', 'deflate') if brotli is not None else (
+    'gzip', 'deflate')
+
+# smaller bodies are not worth compressing
+MIN_SIZE = 256
+
+ZLIB_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def accepted_encoding(request):
+    """Preferred content coding of *request* ``Accept-Encoding``."""
+    header = request.headers.get(hdrs.ACCEPT_ENCODING)
+    if not header:
+        return None
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # gzip container for gzip, zlib container for deflate
+    wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+    compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+def encoded_etag(etag, encoding):
+    """Entity tag of the *encoding* variant of a response."""
+    return '{}-{}"'.format(etag[:-1], encoding)
+
+
+def strip_encoding(etag):
+    for encoding in ENCODINGS:
+        suffix = '-{}"'.format(encoding)
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def compress_response(request, response, variants=None):
+    """Compress the body of *response* as *request* accepts.
+
+    Compressed bodies are taken from and stored into the *variants* mapping
+    of content coding to bytes when given.
+    """
+    body = response.body
+    if (not isinstance(body, (bytes, bytearray)) or len(body) < MIN_SIZE or
+            hdrs.CONTENT_ENCODING in response.headers):
+        return response
+    response.headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+    encoding = accepted_encoding(request)
+    if encoding is None:
+        return response
+
+    data = None if variants is None else variants.get(encoding)
+    if data is None:
+        data = compress(body, encoding)
+        if variants is not None:
+            variants[encoding] = data
+    response.body = data
+    response.headers[hdrs.CONTENT_ENCODING] = encoding
+    etag = response.headers.get(hdrs.ETAG)
+    if etag is not None:
+        response.headers[hdrs.ETAG] = encoded_etag(etag, encoding)
+    return response
@@ -3,3 +3,7 @@ class TemplateNotFound(IOError, LookupError):
     def __init__(self, name):
         IOError.__init__(self)
         self.name = name
+
+    def __reduce__(self):
+        # pickled when raised in a worker process
+        return type(self), (self.name,)
@@ -0,0 +1,116 @@
+import posixpath
+import re
+
+
+# ``load:`` expressions of tal and metal attributes, not the end of words
+# such as ``download:``
+LOAD_RE = re.compile(r'(?<![\w-])load:\s*([^"\'\s;]+)')
+DEFINE_MACRO_RE = re.compile(r'metal:define-macro\s*=')
+
+
+def scan_source(source):
+    """``load:`` expressions and whether *source* defines macros."""
+    return (set(LOAD_RE.findall(source)),
+            DEFINE_MACRO_RE.search(source) is not None)
+
+
+def resolve(template_name, spec, names):
+    """Name of the template loaded by *spec* from *template_name*.
+
+    Chameleon first looks for loaded templates next to the loading one.
+    """
+    relative = posixpath.normpath(
+        posixpath.join(posixpath.dirname(template_name), spec))
+    if relative in names:
+        return relative
+    return posixpath.normpath(spec)
+
+
+class TemplateGraph():
+    """Templates and the templates whose macros they load.
+
+    *loads* maps template names to the names they load. Templates with
+    dynamic ``load:`` expressions, e.g. ``load: ${layout}``, are in
+    *dynamic*, *layouts* define macros.
+    """
+
+    def __init__(self, loads, dynamic=(), layouts=()):
+        self.loads = {name: frozenset(deps) for name, deps in loads.items()}
+        self.dynamic = frozenset(dynamic)
+        self.layouts = frozenset(layouts)
+        # name -> templates loading it
+        self.loaded_by = {}
+        for name, deps in self.loads.items():
+            for dep in deps:
+                self.loaded_by.setdefault(dep, set()).add(name)
+
+    def __repr__(self):
+        return '<TemplateGraph of {} templates>'.format(len(self.loads))
+
+    def dependents(self, template_names):
+        """Templates loading any of *template_names*, directly or not.
+
+        Templates with dynamic ``load:`` expressions may load any of them
+        and are always included.
+        """
+        result = set()
+        pending = list(template_names)
+        while pending:
+            for name in self.loaded_by.get(pending.pop(), ()):
+                if name not in result:
+                    result.add(name)
+                    pending.append(name)
+        if template_names:
+            result |= self.dynamic
+        return result
+
+    def levels(self, template_names=None):
+        """Batches of templates, each one loading only earlier ones.
+
+        Templates of a batch are independent of each other. Cycles are
+        broken arbitrarily.
+        """
+        if template_names is None:
+            template_names = self.loads
+        template_names = set(template_names)
+        depths = {}
+
+        def depth(name, visiting):
+            if name in depths:
+                return depths[name]
+            visiting.add(name)
+            value = 0
+            for dep in self.loads.get(name, ()):
+                if dep in template_names and dep not in visiting:
+                    value = max(value, depth(dep, visiting) + 1)
+            visiting.discard(name)
+            depths[name] = value
+            return value
+
+        batches = []
+        for name in sorted(template_names):
+            level = depth(name, set())
+            while len(batches) <= level:
+                batches.append([])
+            batches[level].append(name)
+        return [sorted(batch) for batch in batches]
+
+    def order(self, template_names=None):
+        """Templates in topological order, loaded templates first."""
+        return [name for batch in self.levels(template_names)
+                for name in batch]
+
+    def unused_layouts(self):
+        """Templates defining macros which no template loads.
+
+        Dynamic ``load:`` expressions are not taken into account.
+        """
+        return sorted(self.layouts - self.loaded_by.keys())
+
+    def shared_layouts(self, min_dependents=2):
+        """Layouts and their number of dependents, most used first."""
+        counts = [(name, len(self.dependents([name]) - self.dynamic))
+                  for name in self.layouts]
+        return sorted(((name, count) for name, count in counts
+                       if count >= min_dependents),
+                      key=lambda item: (-item[1], item[0]))
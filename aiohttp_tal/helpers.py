@@ -1,16 +1,13 @@
 
 
-def url_for(app, __route_name, **parts):
-    """Filter for generating urls.
+import threading
+from collections import OrderedDict
+
+from .static import APP_STATIC_MANIFEST_KEY
+from .utils import app_function_wrapper
 
-    Usage: {{ url('the-view-name') }} might become "/path/to/view" or
-    {{ url('item-details', id=123, query={'active': 'true'}) }}
-    might become "/items/1?active=true".
-    """
-    query = None
-    if 'query_' in parts:
-        query = parts.pop('query_')
 
+def _check_parts(parts):
     for key in parts:
         val = parts[key]
         if isinstance(val, str):
@@ -25,12 +22,101 @@ def url_for(app, __route_name, **parts):
                             "got {} -> [{}] {!r}".format(key, type(val), val))
         parts[key] = val
 
+
+def url_for(app, __route_name, **parts):
+    """Filter for generating urls.
+
+    Usage: {{ url('the-view-name') }} might become "/path/to/view" or
+    {{ url('item-details', id=123, query={'active': 'true'}) }}
+    might become "/items/1?active=true".
+    """
+    query = None
+    if 'query_' in parts:
+        query = parts.pop('query_')
+
+    _check_parts(parts)
+
     url = app.router[__route_name].url_for(**parts)
     if query:
         url = url.with_query(query)
     return url
 
 
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return type(value), value
+
+
+class UrlBuilder():
+    """Memoizing version of :func:`url_for` bound to an application.
+
+    Generated urls are kept in a least-recently-used cache of *maxsize*
+    entries, and route resources are looked up once the router is frozen.
+
+    Usage: {{ url('item-details', id=123) }} as :func:`url_for`, or
+    {{ url.many('item-details', [{'id': 1}, {'id': 2}]) }} to generate the
+    urls of many items of the same route.
+    """
+
+    def __init__(self, app, maxsize=4096):
+        self._app = app
+        self._maxsize = maxsize
+        self._cache = OrderedDict()
+        # templates are rendered in executor threads too
+        self._lock = threading.Lock()
+        self._resources = None
+
+    def _resource(self, route_name):
+        router = self._app.router
+        if not getattr(router, 'frozen', False):
+            return router[route_name]
+        if self._resources is None:
+            self._resources = dict(router.named_resources())
+        return self._resources[route_name]
+
+    def _build(self, resource, parts):
+        query = parts.pop('query_', None)
+        _check_parts(parts)
+        url = resource.url_for(**parts)
+        if query:
+            url = url.with_query(query)
+        return url
+
+    def __call__(self, __route_name, **parts):
+        try:
+            key = (__route_name, _freeze(parts))
+            hash(key)
+        except TypeError:
+            # unhashable parts are checked and rejected by url_for
+            return self._build(self._resource(__route_name), parts)
+
+        with self._lock:
+            url = self._cache.get(key)
+            if url is not None:
+                self._cache.move_to_end(key)
+                return url
+        url = self._build(self._resource(__route_name), parts)
+        with self._lock:
+            self._cache[key] = url
+            if len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+        return url
+
+    def many(self, __route_name, parts_list):
+        """Generate the urls of route *__route_name* for each of the
+        *parts_list* mappings of url parts."""
+        resource = self._resource(__route_name)
+        return [self._build(resource, dict(parts)) for parts in parts_list]
+
+    def cache_clear(self):
+        with self._lock:
+            self._cache.clear()
+        self._resources = None
+
+
 def static_url(app, static_file_path):
     """Filter for generating urls for static files.
 
@@ -38,7 +124,8 @@ def static_url(app, static_file_path):
     to set app['static_root_url'] to be used as the root for the urls returned.
 
     Usage: {{ static('styles.css') }} might become
-    "/static/styles.css" or "http://mycdn.example.com/styles.css"
+    "/static/styles.css" or "http://mycdn.example.com/styles.css", or
+    "/static/styles.1a2b3c4d5e6f.css" with :func:`aiohttp_tal.setup_static`.
     """
     try:
         static_url = app['static_root_url']
@@ -47,10 +134,25 @@ def static_url(app, static_file_path):
             "app does not define a static root url "
             "'static_root_url', you need to set the url root "
             "with app['static_root_url'] = '<static root>'.") from None
-    return '{}/{}'.format(static_url.rstrip('/'), static_file_path.lstrip('/'))
+    static_file_path = static_file_path.lstrip('/')
+    manifest = app.get(APP_STATIC_MANIFEST_KEY)
+    if manifest is not None:
+        static_file_path = manifest.get(static_file_path)
+    return '{}/{}'.format(static_url.rstrip('/'), static_file_path)
 
 
 GLOBAL_HELPERS = dict(
     url=url_for,
     static=static_url,
 )
+
+
+def make_helpers(app, names=GLOBAL_HELPERS):
+    """Global helpers bound to *app*."""
+    helpers = {}
+    for name in names:
+        if name == 'url':
+            helpers[name] = UrlBuilder(app)
+        else:
+            helpers[name] = app_function_wrapper(app, GLOBAL_HELPERS[name])
+    return helpers
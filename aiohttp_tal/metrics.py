@@ -0,0 +1,105 @@
+import bisect
+import threading
+
+from aiohttp import web
+
+
+# seconds, as the default buckets of prometheus clients
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram():
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        # observations of each bucket, the last one for larger values
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace(
+        '"', r'\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class TemplateMetrics():
+    """Durations and output sizes of templates, aggregated per template.
+
+    Add it to :attr:`Environment.instruments` and serve :meth:`handle` to
+    expose them in the Prometheus text format::
+
+        metrics = aiohttp_tal.TemplateMetrics()
+        env.instruments.append(metrics)
+        app.router.add_get('/metrics', metrics.handle)
+    """
+
+    def __init__(self, *, buckets=DEFAULT_BUCKETS, prefix='aiohttp_tal'):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        # (event, template name) -> Histogram
+        self.histograms = {}
+        # template name -> bytes
+        self.output_bytes = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event, template_name, seconds, size=None):
+        # renders run in executor threads
+        with self._lock:
+            histogram = self.histograms.get((event, template_name))
+            if histogram is None:
+                histogram = self.histograms[(event, template_name)] = (
+                    Histogram(self.buckets))
+            histogram.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram.count += 1
+            histogram.sum += seconds
+            if event == 'render' and size is not None:
+                self.output_bytes[template_name] = (
+                    self.output_bytes.get(template_name, 0) + size)
+
+    def clear(self):
+        with self._lock:
+            self.histograms.clear()
+            self.output_bytes.clear()
+
+    def render(self):
+        """Metrics in the Prometheus text exposition format."""
+        name = self.prefix + '_seconds'
+        lines = [
+            '# HELP {} Time spent by templates in each event.'.format(name),
+            '# TYPE {} histogram'.format(name),
+        ]
+        with self._lock:
+            histograms = sorted(
+                (key, list(h.counts), h.count, h.sum)
+                for key, h in self.histograms.items())
+            output_bytes = sorted(self.output_bytes.items())
+
+        for (event, template_name), counts, count, total in histograms:
+            labels = 'event="{}",template="{}"'.format(
+                _label(event), _label(template_name))
+            cumulative = 0
+            for bound, observed in zip(self.buckets + ('+Inf',), counts):
+                cumulative += observed
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                    name, labels, _number(bound), cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(name, labels,
+                                                  _number(total)))
+            lines.append('{}_count{{{}}} {}'.format(name, labels, count))
+
+        name = self.prefix + '_output_bytes_total'
+        lines.append('# HELP {} Size of the rendered output.'.format(name))
+        lines.append('# TYPE {} counter'.format(name))
+        for template_name, size in output_bytes:
+            lines.append('{}{{template="{}"}} {}'.format(
+                name, _label(template_name), size))
+        return '\n'.join(lines) + '\n'
+
+    async def handle(self, request):
+        return web.Response(text=self.render(), headers={
+            'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
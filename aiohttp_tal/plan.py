@@ -0,0 +1,32 @@
+def html_content_type(encoding):
+    if encoding is None:
+        return 'text/html'
+    return 'text/html; charset={}'.format(encoding)
+
+
+class RenderPlan():
+    """What a handler decorated with ``template`` resolves once per
+    application.
+
+    Templates are still looked up in the :class:`Environment` on each
+    render, which compiles them again when their source changes.
+    """
+
+    __slots__ = ('env', 'template_name', 'inline', 'content_type')
+
+    def __init__(self, env, template_name, *, executor=None,
+                 encoding='utf-8'):
+        self.env = env
+        self.template_name = template_name
+        # rendered in the event loop, neither in an executor nor processes
+        self.inline = (executor is None and env.executor is None and
+                       env.renderer is None)
+        self.content_type = html_content_type(encoding)
+
+    def __repr__(self):
+        return '<RenderPlan of {!r}>'.format(self.template_name)
+
+    def get_template(self, macro=None):
+        if macro is None:
+            return self.env.get_template(self.template_name)
+        return self.env.get_macro(self.template_name, macro)
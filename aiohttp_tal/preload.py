@@ -0,0 +1,102 @@
+import asyncio
+import posixpath
+import re
+
+from aiohttp import hdrs
+from aiohttp.http import HttpVersion11
+
+
+# static('path') calls with a literal path
+STATIC_RE = re.compile(r'''\bstatic\(\s*(['"])([^'"]+)\1\s*\)''')
+
+# destination of preloaded files by extension
+PRELOAD_TYPES = {
+    '.css': 'style',
+    '.js': 'script',
+    '.mjs': 'script',
+    '.woff2': 'font',
+    '.woff': 'font',
+    '.ttf': 'font',
+    '.otf': 'font',
+    '.png': 'image',
+    '.jpg': 'image',
+    '.jpeg': 'image',
+    '.gif': 'image',
+    '.svg': 'image',
+    '.webp': 'image',
+    '.avif': 'image',
+}
+
+
+def scan_static(source):
+    """Paths given to the ``static`` helper in *source*, in order."""
+    paths = []
+    for quote, path in STATIC_RE.findall(source):
+        if path not in paths:
+            paths.append(path)
+    return paths
+
+
+def preload_link(url, path):
+    destination = PRELOAD_TYPES.get(posixpath.splitext(path)[1].lower())
+    if destination is None:
+        return None
+    link = '<{}>; rel=preload; as={}'.format(url, destination)
+    if destination == 'font':
+        # fonts are always fetched in cors mode
+        link += '; crossorigin'
+    return link
+
+
+def preload_header(env, template_name):
+    """``Link`` header preloading the static files of a template.
+
+    Returns ``None`` when the template and the templates it loads use no
+    static file which can be preloaded.
+    """
+    static = env.globals.get('static')
+    if static is None:
+        return None
+    links = []
+    for path in env.static_assets(template_name):
+        try:
+            url = static(path)
+        except RuntimeError:
+            # no static_root_url, the template fails to render anyway
+            return None
+        link = preload_link(url, path)
+        if link is not None:
+            links.append(link)
+    return ', '.join(links) or None
+
+
+async def load_preload_header(env, template_name):
+    """:func:`preload_header`, scanning template sources in an executor.
+
+    Sources are only read the first time, or after the template changed.
+    """
+    if template_name in env._static_assets:
+        return preload_header(env, template_name)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(env.executor, preload_header, env,
+                                      template_name)
+
+
+def send_early_hints(request, link):
+    """Send a ``103 Early Hints`` response with a *link* header.
+
+    Only HTTP/1.1 clients get it. It must be sent before the final response
+    is prepared.
+    """
+    transport = request.transport
+    if (request.version < HttpVersion11 or transport is None or
+            transport.is_closing()):
+        return False
+    # aiohttp has no API for informational responses, the status line is
+    # written to the transport, bypassing the writer of the response. This
+    # is only valid while nothing of the final response is written, and
+    # HTTP/1.0 clients and some proxies do not expect it. HTTP/2 servers in
+    # front of the application only forward it when they support it.
+    transport.write('HTTP/1.1 103 Early Hints\r\n{}: {}\r\n\r\n'.format(
+        hdrs.LINK, link).encode('latin-1'))
+    return True
@@ -0,0 +1,158 @@
+import asyncio
+import pickle
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import chameleon
+from aiohttp import web
+
+from .helpers import GLOBAL_HELPERS, make_helpers
+from .utils import Environment, render_output
+
+
+# environment of a worker process, set up by _init_worker
+_worker_env = None
+
+
+def _picklable(value):
+    try:
+        pickle.dumps(value)
+    except Exception:
+        return False
+    return True
+
+
+def _shared(namespace, kind, exclude=()):
+    # values sent to the workers, which cannot get the unpicklable ones
+    shared = {}
+    for name, value in namespace.items():
+        if name in exclude:
+            continue
+        if _picklable(value):
+            shared[name] = value
+        else:
+            warnings.warn(
+                "{} {!r} cannot be pickled, it is not available to templates "
+                "rendered in processes".format(kind, name), RuntimeWarning)
+    return shared
+
+
+def _loader_spec(loader):
+    # template loaders cache template instances which cannot be pickled,
+    # a loader of the same class is built again in the worker
+    if isinstance(loader, chameleon.PageTemplateLoader):
+        return (type(loader), loader.search_path, loader.default_extension,
+                loader.kwargs)
+    return (None, loader, None, None)
+
+
+def _make_loader(spec):
+    cls, loader, default_extension, kwargs = spec
+    if cls is None:
+        return loader
+    return cls(loader, default_extension, **kwargs)
+
+
+def _route_table(app):
+    routes = {}
+    for name, resource in app.router.named_resources().items():
+        info = resource.get_info()
+        if 'formatter' in info:
+            routes[name] = info['formatter']
+        elif 'path' in info:
+            routes[name] = info['path']
+        elif 'prefix' in info:
+            # static resources build urls from a filename
+            routes[name] = info['prefix'].rstrip('/') + '/{filename}'
+    return routes
+
+
+def _init_worker(loader_spec, routes, app_items, helpers, globals_, filters,
+                 cache_dir):
+    global _worker_env
+
+    app = web.Application()
+    app.update(app_items)
+    for name, path in routes.items():
+        app.router.add_resource(path, name=name)
+
+    env = Environment(_make_loader(loader_spec), cache_dir=cache_dir)
+    env.globals.update(make_helpers(app, helpers))
+    env.globals.update(globals_)
+    env.globals['app'] = app
+    env.filters.update(filters)
+    _worker_env = env
+
+
+def _render_in_worker(template_name, contexts, encoding, macro):
+    env = _worker_env
+    if macro is None:
+        template = env.get_template(template_name)
+    else:
+        template = env.get_macro(template_name, macro)
+    return render_output(template, env.namespace, contexts, encoding)
+
+
+class ProcessRenderer():
+    """Render templates in a pool of worker processes.
+
+    Every worker builds its own :class:`Environment` from the loader, the
+    compiled template cache directory, the picklable globals, filters and
+    application items of the parent environment. The ``url`` and ``static`` helpers are rebuilt from the
+    application route table, so the pool is started once the application
+    router is frozen.
+    """
+
+    def __init__(self, max_workers=None):
+        self._max_workers = max_workers
+        self._executor = None
+        self._env = None
+
+    def start(self, app, env):
+        helpers = [k for k in GLOBAL_HELPERS if k in env.globals]
+        globals_ = _shared(env.globals, 'Global',
+                           exclude=set(helpers) | {'app'})
+        filters = _shared(env.filters, 'Filter')
+        app_items = {k: v for k, v in app.items()
+                     if isinstance(k, str) and _picklable(v)}
+        self._executor = ProcessPoolExecutor(
+            self._max_workers, initializer=_init_worker,
+            initargs=(_loader_spec(env._loader), _route_table(app),
+                      app_items, helpers, globals_, filters, env._cache_dir))
+        self._env = env
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def render(self, template_name, contexts, encoding=None,
+                     macro=None):
+        """Render a template to text, or to bytes with an *encoding*.
+
+        Only the context values the template may use are sent to the
+        worker, a :exc:`TypeError` names the ones which cannot be pickled.
+        """
+        if self._executor is None:
+            raise RuntimeError("Process renderer is not started")
+        names = self._env.referenced_names(template_name)
+        if names is None:
+            contexts = [dict(context) for context in contexts]
+        else:
+            contexts = [{k: v for k, v in context.items() if k in names}
+                        for context in contexts]
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, _render_in_worker, template_name, contexts,
+                encoding, macro)
+        except Exception as e:
+            unpicklable = sorted({k for context in contexts
+                                  for k, v in context.items()
+                                  if not _picklable(v)})
+            if not unpicklable:
+                raise
+            raise TypeError(
+                "Context values of {} cannot be pickled to render template "
+                "'{}' in a process".format(', '.join(unpicklable),
+                                           template_name)) from e
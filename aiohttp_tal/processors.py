@@ -0,0 +1,157 @@
+import asyncio
+import inspect
+
+
+class ContextProcessor():
+    """Context processor with dependencies and a timeout.
+
+    *depends* lists processors which must run before this one, they must
+    come earlier in the processors given to :func:`aiohttp_tal.setup`. Their
+    results are in the request context when *func* is called.
+
+    When *timeout* seconds elapse, *fallback* is used as the result, or
+    :exc:`asyncio.TimeoutError` is raised if there is no fallback.
+
+    A processor declaring the names it *provides* is lazy: it only runs
+    before rendering a template which may use any of these names.
+    """
+
+    def __init__(self, func, *, depends=(), timeout=None, fallback=None,
+                 provides=()):
+        self.func = func
+        self.depends = tuple(depends)
+        self.provides = frozenset(provides)
+        self.timeout = timeout
+        self.fallback = fallback
+
+    def __repr__(self):
+        return '<ContextProcessor {!r}>'.format(self.func)
+
+    async def __call__(self, request):
+        if self.timeout is None:
+            return await self.func(request)
+        try:
+            return await asyncio.wait_for(self.func(request), self.timeout)
+        except asyncio.TimeoutError:
+            if self.fallback is None:
+                raise
+            return dict(self.fallback)
+
+
+async def _run(processor, request, context, dependencies):
+    if dependencies:
+        for result in await asyncio.gather(*dependencies):
+            context.update(result)
+    return await processor(request)
+
+
+async def run_concurrently(processors, request, context, *, ran=()):
+    """Run context processors concurrently.
+
+    Returns their results in the order of *processors*. Processors start
+    at once, except :class:`ContextProcessor` with dependencies which wait
+    for them, and find their results merged into *context*. Dependencies
+    in *ran* already have their results in *context*.
+    """
+    positions = {}
+    dependencies = []
+    for i, processor in enumerate(processors):
+        indexes = []
+        for dependency in getattr(processor, 'depends', ()):
+            if dependency in ran:
+                continue
+            if dependency not in positions:
+                raise ValueError(
+                    "{!r} depends on {!r} which is not an earlier context "
+                    "processor".format(processor, dependency))
+            indexes.append(positions[dependency])
+        dependencies.append(indexes)
+        positions[processor] = i
+        if isinstance(processor, ContextProcessor):
+            positions[processor.func] = i
+
+    tasks = []
+    for processor, indexes in zip(processors, dependencies):
+        tasks.append(asyncio.ensure_future(_run(
+            processor, request, context, [tasks[i] for i in indexes])))
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def is_lazy(processor):
+    return bool(getattr(processor, 'provides', None))
+
+
+async def run_lazy(processors, request, context, names):
+    """Run the lazy processors providing any of *names* concurrently.
+
+    All of them run when *names* is ``None``, otherwise the lazy processors
+    they depend on run too. Results are merged into *context* in order.
+    """
+    lazy = {}
+    for processor in processors:
+        lazy[processor] = processor
+        if isinstance(processor, ContextProcessor):
+            lazy[processor.func] = processor
+    if names is not None:
+        selected = {p for p in processors if names & p.provides}
+        # dependencies come earlier, which completes the selection
+        for processor in reversed(processors):
+            if processor in selected:
+                selected.update(lazy[dependency]
+                                for dependency in getattr(
+                                    processor, 'depends', ())
+                                if dependency in lazy)
+        processors = [p for p in processors if p in selected]
+    # other processors ran before the handler
+    ran = {dependency for processor in processors
+           for dependency in getattr(processor, 'depends', ())
+           if dependency not in lazy}
+    for result in await run_concurrently(processors, request, context,
+                                         ran=ran):
+        context.update(result)
+
+
+async def resolve_context(context, *, timeout=None, fallbacks=None):
+    """Await the awaitable values of *context* concurrently.
+
+    Returns a copy of *context* with their results, or *context* itself if
+    it has no awaitable values. When *timeout* seconds elapse, or an
+    awaitable fails, the value of its key in *fallbacks* is used, or
+    :exc:`asyncio.TimeoutError` or its exception is raised if there is
+    none.
+    """
+    tasks = {key: asyncio.ensure_future(value)
+             for key, value in context.items() if inspect.isawaitable(value)}
+    if not tasks:
+        return context
+    if fallbacks is None:
+        fallbacks = {}
+
+    done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    context = dict(context)
+    try:
+        for key, task in tasks.items():
+            if task in pending:
+                if key not in fallbacks:
+                    raise asyncio.TimeoutError(
+                        "Context value {!r} timed out".format(key))
+                context[key] = fallbacks[key]
+            elif task.exception() is not None:
+                if key not in fallbacks:
+                    raise task.exception()
+                context[key] = fallbacks[key]
+            else:
+                context[key] = task.result()
+    finally:
+        # retrieve exceptions of the tasks which are not raised
+        for task in done:
+            if not task.cancelled():
+                task.exception()
+    return context
@@ -0,0 +1,108 @@
+import asyncio
+import os
+
+import chameleon
+
+from .utils import log
+
+
+try:
+    import watchfiles
+except ImportError:  # pragma: no cover
+    watchfiles = None
+
+
+def _snapshot(directories):
+    mtimes = {}
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    mtimes[path] = os.stat(path).st_mtime_ns
+                except OSError:
+                    # removed while walking
+                    pass
+    return mtimes
+
+
+class TemplateWatcher():
+    """Invalidate the templates of an :class:`Environment` as they change.
+
+    Watches the search paths of a :class:`chameleon.PageTemplateLoader`,
+    with inotify or the equivalent of the platform when the ``watchfiles``
+    package is installed, or by polling every *interval* seconds. Changed
+    templates are dropped with :meth:`Environment.invalidate_files`, so
+    template files are never checked on render.
+    """
+
+    def __init__(self, env, *, interval=1.0, use_watchfiles=True):
+        self.env = env
+        self.interval = interval
+        self.use_watchfiles = use_watchfiles and watchfiles is not None
+        self._task = None
+        self._stop_event = None
+
+    def directories(self):
+        loader = self.env._loader
+        if not isinstance(loader, chameleon.PageTemplateLoader):
+            return []
+        return [os.path.abspath(path) for path in loader.search_path
+                if os.path.isdir(path)]
+
+    def invalidate(self, paths):
+        names = self.env.invalidate_files(paths)
+        if names:
+            log.info("Templates changed: %s", ', '.join(names))
+        return names
+
+    async def _invalidate(self, paths):
+        # template sources are read to find the dependents
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(None, self.invalidate, paths)
+        except Exception:
+            # keep watching, e.g. files removed while reading them
+            log.exception("Failed to invalidate changed templates")
+
+    async def _watch(self, directories):
+        async for changes in watchfiles.awatch(
+                *directories, stop_event=self._stop_event):
+            await self._invalidate({path for change, path in changes})
+
+    async def _poll(self, directories):
+        loop = asyncio.get_event_loop()
+        mtimes = await loop.run_in_executor(None, _snapshot, directories)
+        while True:
+            await asyncio.sleep(self.interval)
+            current = await loop.run_in_executor(None, _snapshot, directories)
+            changed = {path for path in mtimes.keys() | current.keys()
+                       if mtimes.get(path) != current.get(path)}
+            mtimes = current
+            if changed:
+                await self._invalidate(changed)
+
+    async def start(self):
+        directories = self.directories()
+        if not directories or self._task is not None:
+            return
+        if self.use_watchfiles:
+            self._stop_event = asyncio.Event()
+            coro = self._watch(directories)
+        else:
+            coro = self._poll(directories)
+        self._task = asyncio.ensure_future(coro)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        if self._stop_event is not None:
+            self._stop_event.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stop_event = None
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import os
+
+from aiohttp import hdrs, web
+
+
+APP_STATIC_MANIFEST_KEY = 'aiohttp_tal_static_manifest'
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def fingerprint(path, digest):
+    """Insert *digest* before the extension of *path*.
+
+    "css/style.css" becomes "css/style.<digest>.css".
+    """
+    head, tail = os.path.split(path)
+    base, ext = os.path.splitext(tail)
+    return '/'.join(filter(None, (head, '{}.{}{}'.format(base, digest, ext))))
+
+
+class StaticManifest():
+    """Content hashed names of the files of a static directory."""
+
+    def __init__(self, directory, *, digest_size=6):
+        self.directory = str(directory)
+        self.digest_size = digest_size
+        # file path -> fingerprinted path
+        self.urls = {}
+        # served path -> (file path, is fingerprinted)
+        self.files = {}
+
+    def _hash(self, filename):
+        digest = hashlib.blake2b(digest_size=self.digest_size)
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def scan(self):
+        urls = {}
+        files = {}
+        for root, dirs, filenames in os.walk(self.directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                full_path = os.path.join(root, filename)
+                path = os.path.relpath(full_path, self.directory)
+                path = path.replace(os.sep, '/')
+                hashed = fingerprint(path, self._hash(full_path))
+                urls[path] = hashed
+                files[path] = (full_path, False)
+                files[hashed] = (full_path, True)
+        self.urls = urls
+        self.files = files
+
+    def get(self, path):
+        """Fingerprinted path of *path*, or *path* if it is unknown."""
+        return self.urls.get(path, path)
+
+    async def handle(self, request):
+        try:
+            full_path, immutable = self.files[request.match_info['filename']]
+        except KeyError:
+            raise web.HTTPNotFound() from None
+        response = web.FileResponse(full_path)
+        if immutable:
+            response.headers[hdrs.CACHE_CONTROL] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def setup_static(app, prefix, directory, *, name=None):
+    """Serve *directory* under *prefix* with content hashed file names.
+
+    The directory is scanned on application startup. The ``static`` helper
+    then returns fingerprinted urls, which are served with immutable cache
+    headers. Files added later are not served until the next start.
+    """
+    manifest = StaticManifest(directory)
+    prefix = prefix.rstrip('/')
+    app.router.add_get(prefix + '/{filename:.+}', manifest.handle, name=name)
+    app[APP_STATIC_MANIFEST_KEY] = manifest
+    if 'static_root_url' not in app:
+        app['static_root_url'] = prefix
+
+    async def on_startup(app):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, manifest.scan)
+
+    app.on_startup.append(on_startup)
+    return manifest
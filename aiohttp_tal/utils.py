@@ -1,6 +1,36 @@
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import types
+from collections import deque, namedtuple, OrderedDict
+from collections.abc import Mapping
+
 import chameleon
+from chameleon.exc import ExceptionFormatter, RenderError
+from chameleon.loader import ModuleLoader
+from chameleon.tal import RepeatDict
+from chameleon.utils import (create_formatted_exception, join,
+                             raise_with_traceback, Scope)
+from chameleon.zpt.template import PageTemplate
 
 from .exceptions import TemplateNotFound
+from .graph import resolve, scan_source, TemplateGraph
+from .preload import scan_static
+
+
+CacheInfo = namedtuple(
+    'CacheInfo', 'hits misses evictions maxsize currsize maxbytes currbytes')
+CompileResult = namedtuple('CompileResult', 'name seconds error')
+
+log = logging.getLogger('aiohttp_tal')
+
+_NO_STREAM = object()
+_MISSING = object()
+_local = threading.local()
 
 
 def app_function_wrapper(app, f):
@@ -9,18 +39,893 @@ def app_function_wrapper(app, f):
     return f_wrapped
 
 
+def _output_stream_factory():
+    stream = _local.__dict__.pop('stream', _NO_STREAM)
+    if stream is _NO_STREAM:
+        return []
+    return stream
+
+
+def _code_strings(code):
+    for const in code.co_consts:
+        if isinstance(const, str):
+            yield const
+        elif isinstance(const, types.CodeType):
+            yield from _code_strings(const)
+
+
+def _code_footprint(code):
+    size = sys.getsizeof(code) + sys.getsizeof(code.co_code)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            size += _code_footprint(const)
+        else:
+            size += sys.getsizeof(const)
+    return size
+
+
+def template_footprint(template):
+    """Estimated memory taken by a compiled template, in bytes.
+
+    Counts the code of its render functions and the globals of its module.
+    """
+    size = sys.getsizeof(template)
+    modules = set()
+    for attr, function in vars(template).items():
+        if not attr.startswith('_render') or not callable(function):
+            continue
+        size += _code_footprint(function.__code__)
+        module = function.__globals__
+        if id(module) not in modules:
+            modules.add(id(module))
+            size += sys.getsizeof(module)
+            for value in module.values():
+                if isinstance(value, (str, dict, tuple)):
+                    size += sys.getsizeof(value)
+    return size
+
+
+def template_names(template):
+    """Names a compiled template may look up, and the templates it loads.
+
+    Returns a pair of sets, names are a superset of the variables the
+    template uses. Loaded templates are the ``load:`` expressions.
+    """
+    template.cook_check()
+    names = set()
+    loads = set()
+    for attr, function in vars(template).items():
+        if not attr.startswith('_render') or not callable(function):
+            continue
+        names.update(s for s in _code_strings(function.__code__)
+                     if s.isidentifier())
+        tokens = function.__globals__.get('__tokens', {})
+        for expression, line, column in tokens.values():
+            expression = expression.strip()
+            if expression.startswith('load:'):
+                loads.add(expression[5:].strip())
+    return names, loads
+
+
+def render_into(template, stream, **kwargs):
+    """Render *template* appending its output to *stream*.
+
+    Returns the text left in *stream* once rendered.
+    """
+    return render_scope(template, {}, (kwargs,), stream)
+
+
+def _render_into_factory(template, stream, kwargs):
+    # chameleon creates the output stream of the top-level render with the
+    # template factory, it only gives *stream* to this thread next call
+    template.output_stream_factory = _output_stream_factory
+    _local.stream = stream
+    try:
+        return template.render(**kwargs)
+    finally:
+        _local.__dict__.pop('stream', None)
+
+
+class OutputStream(list):
+    """Chameleon output stream that writes encoded chunks as it grows.
+
+    *write* is called with bytes every time *chunk_size* characters are
+    buffered.
+    """
+
+    def __init__(self, write, chunk_size, encoding):
+        super().__init__()
+        self._write = write
+        self._chunk_size = chunk_size
+        self._encoding = encoding
+        self._flushed = 0
+        self._size = 0
+        # time spent encoding the output
+        self.encode_seconds = 0.0
+
+    def append(self, value):
+        list.append(self, value)
+        self._size += len(value)
+        if self._size >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        if list.__len__(self):
+            start = time.perf_counter()
+            data = ''.join(self).encode(self._encoding)
+            self.encode_seconds += time.perf_counter() - start
+            self._write(data)
+            self._flushed += list.__len__(self)
+            list.clear(self)
+            self._size = 0
+
+    def __len__(self):
+        return self._flushed + list.__len__(self)
+
+    def __delitem__(self, key):
+        # ``tal:on-error`` drops the output since a mark, output that has
+        # already been flushed cannot be dropped anymore
+        if isinstance(key, slice) and key.start is not None:
+            key = slice(max(key.start - self._flushed, 0), key.stop,
+                        key.step)
+        list.__delitem__(self, key)
+
+
+class ByteStream(OutputStream):
+    """Chameleon output stream encoding its output into :attr:`buffer`.
+
+    Fragments are encoded every *chunk_size* characters, so the output is
+    never joined into a single string.
+    """
+
+    def __init__(self, encoding, chunk_size=8192):
+        self.buffer = bytearray()
+        super().__init__(self.buffer.extend, chunk_size, encoding)
+        # output length -> buffer length, at the marks taken by len()
+        self._marks = {}
+
+    def __len__(self):
+        # ``tal:on-error`` takes a mark before the output it may drop, the
+        # buffer length at the mark is kept to truncate it
+        self.flush()
+        self._marks[self._flushed] = len(self.buffer)
+        return self._flushed
+
+    def __delitem__(self, key):
+        if (isinstance(key, slice) and key.start is not None and
+                key.stop is None and key.start <= self._flushed):
+            list.clear(self)
+            self._size = 0
+            del self.buffer[self._marks[key.start]:]
+            self._flushed = key.start
+        else:
+            list.__delitem__(self, key)
+
+
+def render_bytes(template, encoding, **kwargs):
+    """Render *template* into a :class:`bytearray` encoded with *encoding*."""
+    return render_output(template, {}, (kwargs,), encoding)
+
+
+def render_output(template, namespace, contexts, encoding=None):
+    """Render *template* to text, or to bytes with an *encoding*.
+
+    Variables are looked up as by :func:`render_scope`.
+    """
+    if encoding is None:
+        return render_scope(template, namespace, contexts)
+    stream = ByteStream(encoding)
+    render_scope(template, namespace, contexts, stream)
+    stream.flush()
+    return stream.buffer
+
+
+# renders the macro given as a variable, shared by all macros
+MACRO_SOURCE = '<metal:macro use-macro="aiohttp_tal_macro" />'
+
+
+class MacroTemplate():
+    """Macro of a template, rendered on its own like a template."""
+
+    def __init__(self, wrapper, macro):
+        self._wrapper = wrapper
+        self._macro = macro
+
+    @property
+    def output_stream_factory(self):
+        return self._wrapper.output_stream_factory
+
+    @output_stream_factory.setter
+    def output_stream_factory(self, value):
+        self._wrapper.output_stream_factory = value
+
+    def cook_check(self):
+        return self._wrapper.cook_check()
+
+    def render(self, **kwargs):
+        return self._wrapper.render(aiohttp_tal_macro=self._macro, **kwargs)
+
+
+class NamespaceScope(Scope):
+    """Variables of a render, looked up in a shared namespace last.
+
+    Copies made by macros share the namespace too, it is never copied.
+    """
+
+    __slots__ = ('namespace',)
+
+    def get(self, key, default=None):
+        value = dict.get(self, key, _MISSING)
+        if value is not _MISSING:
+            return value
+        root = getattr(self, '_root', None)
+        if root is not None:
+            value = dict.get(root, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return self.namespace.get(key, default)
+
+    def get_name(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise NameError(key)
+        return value
+
+    def copy(self):
+        scope = NamespaceScope(self)
+        scope._root = getattr(self, '_root', self)
+        scope.namespace = self.namespace
+        return scope
+
+
+def _set_defaults(template, scope):
+    # variables PageTemplate.render gives to the generated code
+    encoding = dict.pop(scope, 'encoding', None)
+    if encoding is None:
+        encoding = template.encoding
+    translate = scope.get('translate')
+    if translate is None:
+        translate = template.translate
+        if translate is None:
+            translate = type(template).translate
+    if encoding is not None:
+        def translate(msgid, txl=translate, encoding=encoding, **kwargs):
+            if isinstance(msgid, bytes):
+                msgid = bytes.decode(msgid, encoding)
+            return txl(msgid, **kwargs)
+
+        def decode(inst, encoding=encoding):
+            return bytes.decode(inst, encoding, 'ignore')
+    else:
+        decode = bytes.decode
+    setdefault = scope.setdefault
+    setdefault('__translate', translate)
+    setdefault('__decode', decode)
+    setdefault('__on_error_handler', template.on_error_handler)
+    if 'target_language' not in scope:
+        scope['target_language'] = None
+    if 'repeat' not in scope:
+        scope['repeat'] = RepeatDict({})
+
+
+def render_scope(template, namespace, contexts=(), stream=None):
+    """Render *template* with the variables of *contexts* and *namespace*.
+
+    Later contexts override earlier ones, which override *namespace*. Unlike
+    ``template.render(**variables)``, *namespace* is looked up and not
+    copied. The output is appended to *stream* when given, returns the text
+    left in it.
+    """
+    if isinstance(template, MacroTemplate):
+        contexts = ({'aiohttp_tal_macro': template._macro},) + tuple(contexts)
+        template = template._wrapper
+    if not isinstance(template, PageTemplate):
+        variables = dict(namespace)
+        for context in contexts:
+            variables.update(context)
+        if stream is None:
+            return template.render(**variables)
+        return _render_into_factory(template, stream, variables)
+
+    scope = NamespaceScope()
+    scope.namespace = namespace
+    for context in contexts:
+        dict.update(scope, context)
+    _set_defaults(template, scope)
+    rcontext = {}
+    template.cook_check()
+    if stream is None:
+        stream = template.output_stream_factory()
+    # as BaseTemplate.render, which builds a scope from keyword arguments
+    try:
+        template._render(stream, scope, rcontext,
+                         target_language=scope.get('target_language'))
+    except RecursionError:
+        raise
+    except BaseException:
+        cls, exc, tb = sys.exc_info()
+        try:
+            errors = rcontext.get('__error__')
+            if errors:
+                formatter = exc.__str__
+                if isinstance(formatter, ExceptionFormatter):
+                    if errors is not formatter._errors:
+                        formatter._errors.extend(errors)
+                    raise
+                # lists the namespace too, as render does
+                arguments = dict(namespace)
+                arguments.update(scope)
+                formatter = ExceptionFormatter(errors, arguments, rcontext,
+                                               template.value_repr)
+                try:
+                    exc = create_formatted_exception(exc, cls, formatter,
+                                                     RenderError)
+                except TypeError:
+                    pass
+                raise_with_traceback(exc, tb)
+            raise
+        finally:
+            del exc, tb
+    return join(stream)
+
+
+class WatchedDict(dict):
+    """Dictionary calling *on_change* every time it is modified."""
+
+    def __init__(self, on_change, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_change = on_change
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._on_change()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._on_change()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        super().clear()
+        self._on_change()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._on_change()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._on_change()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._on_change()
+        return value
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._on_change()
+
+
 class Environment():
 
-    def __init__(self, loader):
+    def __init__(self, loader, *, cache_size=128, cache_max_bytes=None,
+                 executor=None, inline_threshold=4096, cache_dir=None):
+        # globals and filters merged, rebuilt when any of them changes
+        self._namespace = None
         self.globals = {}
         self.filters = {}
+        self.executor = executor
+        self.inline_threshold = inline_threshold
+        # renders templates out of this process, see ProcessRenderer
+        self.renderer = None
+        # callables reporting the events of templates, see instrument()
+        self.instruments = []
         self._loader = loader
+        # configuration given to the templates compiled by the environment
+        self._template_config = {}
+        # template rendering macros, see get_macro()
+        self._macro_wrapper = None
+        # template name -> static files used by it and its layouts
+        self._static_assets = {}
+        # template name -> (source hash for mappings, scan of the source)
+        self._scans = {}
+        # names of the files of a PageTemplateLoader, walked once
+        self._template_names = None
+        # directory of compiled templates, shared with worker processes
+        self._cache_dir = cache_dir
+        if cache_dir is not None:
+            self._setup_cache_dir(cache_dir)
+        # length of the last output of each template, to decide if it is
+        # worth rendering it in an executor
+        self._output_sizes = {}
+        # template name -> (render function, referenced names)
+        self._referenced_names = {}
+        # compiled templates for string sources, keyed by template name and
+        # holding (source hash, template, footprint), and template files
+        # with a ``None`` hash when bounded in bytes; ``None`` is unbounded
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_size = cache_size
+        self._cache_max_bytes = cache_max_bytes
+        self._cache_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def globals(self):
+        return self._globals
+
+    @globals.setter
+    def globals(self, value):
+        self._globals = WatchedDict(self._namespace_changed, value)
+        self._namespace_changed()
+
+    @property
+    def filters(self):
+        return self._filters
+
+    @filters.setter
+    def filters(self, value):
+        self._filters = WatchedDict(self._namespace_changed, value)
+        self._namespace_changed()
+
+    def _namespace_changed(self):
+        self._namespace = None
+
+    @property
+    def namespace(self):
+        """Globals and filters merged, do not modify it."""
+        namespace = self._namespace
+        if namespace is None:
+            namespace = dict(self._globals)
+            namespace.update(self._filters)
+            self._namespace = namespace
+        return namespace
+
+    def referenced_names(self, template_name):
+        """Names template *template_name* may look up, with loaded macros.
+
+        Returns ``None`` when it cannot be known, e.g. for dynamic ``load:``
+        expressions.
+        """
+        template = self.get_template(template_name)
+        template.cook_check()
+        entry = self._referenced_names.get(template_name)
+        if entry is not None and entry[0] is template._render:
+            return entry[1]
+
+        names = set()
+        pending = [template]
+        seen = set()
+        while pending:
+            current = pending.pop()
+            current_names, loads = template_names(current)
+            names.update(current_names)
+            for name in loads - seen:
+                seen.add(name)
+                try:
+                    pending.append(self.get_template(name))
+                except Exception:
+                    names = None
+                    break
+            if names is None:
+                break
+        if names is not None:
+            names = frozenset(names)
+        self._referenced_names[template_name] = (template._render, names)
+        return names
+
+    def _setup_cache_dir(self, cache_dir):
+        # chameleon names generated modules after a digest of the source,
+        # the versions of installed packages and the compile options, and
+        # writes them atomically, so the directory is safely shared between
+        # processes and restarts
+        os.makedirs(cache_dir, exist_ok=True)
+        module_loader = ModuleLoader(cache_dir)
+        self._template_config['loader'] = module_loader
+        if isinstance(self._loader, chameleon.PageTemplateLoader):
+            self._loader.kwargs.setdefault('loader', module_loader)
 
     def get_template(self, template_name):
+        start = time.perf_counter()
         try:
             template = self._loader[template_name]
         except KeyError:
             raise TemplateNotFound(template_name)
+        self.instrument('lookup', template_name,
+                        time.perf_counter() - start)
         if isinstance(template, str):
-            template = chameleon.PageTemplate(template)
+            return self._compile(template_name, template)
+        if self.instruments or self._cache_max_bytes is not None:
+            # template files are compiled on their first render, compile
+            # them now to tell the compile time apart, and measure them
+            start = time.perf_counter()
+            if template.cook_check():
+                self.instrument('compile', template_name,
+                                time.perf_counter() - start)
+        if self._cache_max_bytes is not None and self._cache_size != 0:
+            with self._cache_lock:
+                entry = self._cache.get(template_name)
+                if entry is not None and entry[1] is template:
+                    self._cache.move_to_end(template_name)
+                    return template
+            self._store(template_name, None, template)
+        return template
+
+    def get_macro(self, template_name, macro):
+        """Macro *macro* of template *template_name* as a template.
+
+        Raises :exc:`TemplateNotFound` named ``template_name#macro`` when
+        the template has no such macro.
+        """
+        template = self.get_template(template_name)
+        try:
+            macro = template.macros[macro]
+        except KeyError:
+            raise TemplateNotFound('{}#{}'.format(template_name, macro))
+        if self._macro_wrapper is None:
+            self._macro_wrapper = chameleon.PageTemplate(
+                MACRO_SOURCE, **self._template_config)
+        return MacroTemplate(self._macro_wrapper, macro)
+
+    def instrument(self, event, template_name, seconds, size=None):
+        """Report an *event* of *template_name* to the instruments.
+
+        Events are ``lookup``, ``compile``, ``context``, ``render`` and
+        ``encode``. ``render`` and ``encode`` report the *size* of the
+        output.
+        """
+        for instrument in self.instruments:
+            instrument(event, template_name, seconds, size)
+
+    def _compile(self, template_name, source):
+        source_hash = hash(source)
+        with self._cache_lock:
+            entry = self._cache.get(template_name)
+            if entry is not None and entry[0] == source_hash:
+                self._hits += 1
+                self._cache.move_to_end(template_name)
+                return entry[1]
+            self._misses += 1
+
+        start = time.perf_counter()
+        template = chameleon.PageTemplate(source, **self._template_config)
+        self.instrument('compile', template_name,
+                        time.perf_counter() - start)
+        if self._cache_size != 0:
+            self._store(template_name, source_hash, template)
         return template
+
+    def _store(self, template_name, source_hash, template):
+        size = 0
+        if self._cache_max_bytes is not None:
+            size = template_footprint(template)
+        with self._cache_lock:
+            entry = self._cache.pop(template_name, None)
+            if entry is not None:
+                self._cache_bytes -= entry[2]
+            if (self._cache_max_bytes is not None and
+                    size > self._cache_max_bytes):
+                # would evict everything else, it is not kept
+                self._evictions += 1
+                if source_hash is None:
+                    self._drop_file(template_name, template)
+                return
+            self._cache[template_name] = (source_hash, template, size)
+            self._cache_bytes += size
+            while ((self._cache_size is not None and
+                    len(self._cache) > self._cache_size) or
+                   (self._cache_max_bytes is not None and
+                    self._cache_bytes > self._cache_max_bytes)):
+                name, entry = self._cache.popitem(last=False)
+                self._cache_bytes -= entry[2]
+                self._evictions += 1
+                if entry[0] is None:
+                    self._drop_file(name, entry[1])
+
+    def _drop_file(self, template_name, template=None):
+        registry = getattr(self._loader, 'registry', None)
+        if registry is None:
+            return
+        # keyed by the load arguments, the name comes first
+        for key, value in list(registry.items()):
+            if key[0] == template_name and (template is None or
+                                            value is template):
+                registry.pop(key, None)
+
+    def list_templates(self):
+        """Names of the templates reachable from the loader.
+
+        Mapping keys, or files found in the search paths of a
+        :class:`chameleon.PageTemplateLoader`.
+        """
+        loader = self._loader
+        if isinstance(loader, Mapping):
+            return sorted(loader)
+        if not isinstance(loader, chameleon.PageTemplateLoader):
+            return []
+        if self._template_names is not None:
+            return list(self._template_names)
+        names = set()
+        for path in loader.search_path:
+            for root, dirs, files in os.walk(path):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for filename in files:
+                    if filename.startswith('.'):
+                        continue
+                    if (loader.default_extension is not None and
+                            not filename.endswith(loader.default_extension)):
+                        continue
+                    name = os.path.relpath(os.path.join(root, filename), path)
+                    names.add(name.replace(os.sep, '/'))
+        self._template_names = sorted(names)
+        return list(self._template_names)
+
+    def _render_chunk(self, template_name, template, contexts, encoding):
+        results = []
+        for context in contexts:
+            start = time.perf_counter()
+            output = render_output(template, self.namespace, (context,),
+                                   encoding)
+            self.instrument('render', template_name,
+                            time.perf_counter() - start, len(output))
+            results.append(output)
+        return results
+
+    async def render_many(self, template_name, contexts, *, executor=None,
+                          chunk_size=16, max_pending=4, encoding=None):
+        """Render a template once for each of *contexts*, in order.
+
+        An asynchronous iterator of the rendered texts, or bytes with an
+        *encoding*, which does not need a request. Contexts are rendered by
+        chunks of *chunk_size* in *executor*, defaulting to the one of the
+        environment, with at most *max_pending* chunks rendered or waiting to
+        be consumed at once. *contexts* may be a lazy iterable.
+        """
+        template = self.get_template(template_name)
+        if executor is None:
+            executor = self.executor
+        loop = asyncio.get_event_loop()
+        contexts = iter(contexts)
+        pending = deque()
+
+        def submit():
+            chunk = list(itertools.islice(contexts, chunk_size))
+            if chunk:
+                pending.append(loop.run_in_executor(
+                    executor, self._render_chunk, template_name, template,
+                    chunk, encoding))
+            return bool(chunk)
+
+        try:
+            while len(pending) < max_pending and submit():
+                pass
+            while pending:
+                results = await pending.popleft()
+                submit()
+                for result in results:
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def compile_template(self, template_name):
+        """Load and compile a template, returns a :class:`CompileResult`."""
+        start = time.perf_counter()
+        try:
+            template = self.get_template(template_name)
+            # file templates are compiled on first use
+            template.cook_check()
+        except Exception as e:
+            return CompileResult(template_name, time.perf_counter() - start, e)
+        return CompileResult(template_name, time.perf_counter() - start, None)
+
+    async def precompile(self, template_names=None, *, executor=None):
+        """Compile templates ahead of their first render.
+
+        All templates from :meth:`list_templates` are compiled by default,
+        loaded templates before the ones loading them (see
+        :meth:`dependency_graph`), and in parallel in *executor* when given.
+        Returns a list of :class:`CompileResult`, failures are logged and do
+        not raise.
+        """
+        levels = self.dependency_graph(template_names).levels(template_names)
+        results = []
+        for level in levels:
+            if executor is None:
+                results.extend(self.compile_template(name) for name in level)
+            else:
+                loop = asyncio.get_event_loop()
+                results.extend(await asyncio.gather(*(
+                    loop.run_in_executor(executor, self.compile_template,
+                                         name)
+                    for name in level)))
+        for result in results:
+            if result.error is None:
+                log.info("Compiled template '%s' in %.3fs",
+                         result.name, result.seconds)
+            else:
+                log.warning("Failed to compile template '%s': %r",
+                            result.name, result.error)
+        return results
+
+    def _template_path(self, template_name):
+        for directory in self._loader.search_path:
+            path = os.path.abspath(os.path.join(directory, template_name))
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _template_source(self, template_name):
+        loader = self._loader
+        if isinstance(loader, Mapping):
+            source = loader.get(template_name)
+            return source if isinstance(source, str) else None
+        if not isinstance(loader, chameleon.PageTemplateLoader):
+            return None
+        path = self._template_path(template_name)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read().decode('utf-8', 'replace')
+
+    def _scan(self, template_name):
+        # load: expressions, macros and static files of a template, files
+        # are read once until invalidated, mapping sources when they change
+        key = None
+        if isinstance(self._loader, Mapping):
+            source = self._template_source(template_name)
+            key = hash(source)
+        entry = self._scans.get(template_name)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        if key is None:
+            source = self._template_source(template_name)
+        specs, defines_macros = scan_source(source or '')
+        scan = (specs, defines_macros, scan_static(source or ''))
+        self._scans[template_name] = (key, scan)
+        return scan
+
+    def dependency_graph(self, template_names=None):
+        """:class:`TemplateGraph` of the ``load:`` expressions of templates.
+
+        Built from the sources of *template_names*, all templates from
+        :meth:`list_templates` by default, and of the templates they load.
+        """
+        known = self.list_templates()
+        if template_names is None:
+            template_names = known
+        known = set(known)
+        loads = {}
+        dynamic = set()
+        layouts = set()
+        pending = list(template_names)
+        while pending:
+            name = pending.pop()
+            if name in loads:
+                continue
+            specs, defines_macros, static_paths = self._scan(name)
+            if defines_macros:
+                layouts.add(name)
+            deps = set()
+            for spec in specs:
+                if '$' in spec:
+                    dynamic.add(name)
+                else:
+                    deps.add(resolve(name, spec, known))
+            loads[name] = deps
+            pending.extend(deps - loads.keys())
+        return TemplateGraph(loads, dynamic, layouts)
+
+    def static_assets(self, template_name):
+        """Static files of a template and of the templates it loads.
+
+        Paths given as literal strings to the ``static`` helper, found in
+        the sources, loaded templates first.
+        """
+        assets = self._static_assets.get(template_name)
+        if assets is None:
+            assets = []
+            graph = self.dependency_graph([template_name])
+            for name in graph.order():
+                for path in self._scan(name)[2]:
+                    if path not in assets:
+                        assets.append(path)
+            assets = self._static_assets[template_name] = tuple(assets)
+        return assets
+
+    def record_output_size(self, template_name, size):
+        self._output_sizes[template_name] = size
+
+    def render_inline(self, template_name):
+        size = self._output_sizes.get(template_name)
+        return size is not None and size < self.inline_threshold
+
+    def invalidate(self, template_name=None):
+        """Drop compiled templates from the cache.
+
+        Without arguments the whole cache is cleared. Templates of a
+        :class:`chameleon.PageTemplateLoader` are loaded again on next use.
+        """
+        registry = getattr(self._loader, 'registry', None)
+        if template_name is None:
+            with self._cache_lock:
+                self._cache.clear()
+                self._cache_bytes = 0
+            self._referenced_names.clear()
+            self._static_assets.clear()
+            self._scans.clear()
+            self._template_names = None
+            if registry is not None:
+                registry.clear()
+        else:
+            with self._cache_lock:
+                entry = self._cache.pop(template_name, None)
+                if entry is not None:
+                    self._cache_bytes -= entry[2]
+            self._referenced_names.pop(template_name, None)
+            self._static_assets.pop(template_name, None)
+            self._scans.pop(template_name, None)
+            self._drop_file(template_name)
+
+    def invalidate_files(self, paths):
+        """Drop the templates of changed files and the ones loading them.
+
+        Templates load the macros of other templates with ``load:``
+        expressions, and keep them, so the dependents of a changed file in
+        :meth:`dependency_graph` are dropped too. Returns the names of the
+        dropped templates. Their :meth:`static_assets` are scanned again, out
+        of the request path.
+        """
+        if not isinstance(self._loader, chameleon.PageTemplateLoader):
+            return []
+        changed = set()
+        for path in paths:
+            path = os.path.abspath(path)
+            for directory in self._loader.search_path:
+                name = os.path.relpath(path, os.path.abspath(directory))
+                if not name.startswith(os.pardir):
+                    changed.add(name.replace(os.sep, '/'))
+        if not changed:
+            return []
+        dependents = self.dependency_graph().dependents(changed)
+        # sources are read again, and files may have been added or removed
+        self._template_names = None
+        assets = [name for name in changed | dependents
+                  if self._static_assets.pop(name, None) is not None]
+        for name in changed:
+            self._scans.pop(name, None)
+        stale = {self._template_path(name) for name in changed | dependents}
+        stale.update(os.path.abspath(path) for path in paths)
+
+        entries = [(key[0], os.path.abspath(template.filename))
+                   for key, template in list(self._loader.registry.items())]
+        names = sorted({name for name, filename in entries
+                        if filename in stale})
+        for name in names:
+            self.invalidate(name)
+        for name in assets:
+            self.static_assets(name)
+        return names
+
+    def cache_info(self):
+        return CacheInfo(self._hits, self._misses, self._evictions,
+                         self._cache_size, len(self._cache),
+                         self._cache_max_bytes, self._cache_bytes)
+
+    def cache_largest(self, n=10):
+        """Names and estimated sizes of the *n* largest cached templates.
+
+        Sizes are only estimated with ``cache_max_bytes``.
+        """
+        with self._cache_lock:
+            entries = [(name, entry[2]) for name, entry in self._cache.items()]
+        entries.sort(key=lambda entry: (-entry[1], entry[0]))
+        return entries[:n]
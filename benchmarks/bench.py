@@ -0,0 +1,286 @@
+"""Benchmarks of the aiohttp_tal render pipeline.
+
+Every scenario renders in process, requests are mocked and nothing goes
+through the network. Run from the repository root::
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --compare benchmarks/baseline.json
+    python benchmarks/bench.py --save benchmarks/baseline.json
+
+Results depend on the machine, compare against a baseline saved on the
+same one.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from importlib import metadata
+from pathlib import Path
+
+import chameleon
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import aiohttp_tal  # noqa: E402
+from aiohttp_tal import REQUEST_CONTEXT_KEY, context_processors_middleware  # noqa: E402, E501
+
+
+EXAMPLE_TEMPLATES = ROOT / 'examples' / 'templates'
+
+ROW = ('<tr tal:repeat="row rows"><td>${row.id}</td>'
+       '<td><a href="${url(\'item\', id=row.id)}">${row.name}</a></td>'
+       '<td tal:condition="row.flag">${row.value | 0}</td></tr>')
+
+TEMPLATES = {
+    'small.pt': '<p>Hello ${name}</p>',
+    'medium.pt': '<table>{}</table>'.format(ROW),
+    'huge.pt': '<table>{}</table>'.format(ROW),
+    'base.pt': ('<html metal:define-macro="master"><head>'
+                '<title>${title}</title></head><body>'
+                '<nav metal:define-slot="nav"><a href="${url(\'index\')}">'
+                'Home</a></nav>'
+                '<main metal:define-slot="content"></main>'
+                '<footer metal:define-slot="footer">${title}</footer>'
+                '</body></html>'),
+    'page.pt': ('<html metal:use-macro="base.macros[\'master\']">'
+                '<main metal:fill-slot="content">'
+                '<section tal:repeat="row rows">'
+                '<h2 metal:define-macro="heading">${row.name}</h2>'
+                '<p>${row.value}</p></section></main></html>'),
+}
+
+ROWS = {'small.pt': 0, 'medium.pt': 100, 'huge.pt': 10000, 'page.pt': 100}
+
+
+class Row():
+
+    def __init__(self, i):
+        self.id = i
+        self.name = 'Item {}'.format(i)
+        self.flag = i % 2
+        self.value = i * 1.5
+
+
+def make_context(template_name):
+    return {'name': 'World', 'title': 'Benchmark',
+            'intro': 'Benchmark', 'rows': [
+                Row(i) for i in range(ROWS.get(template_name, 0))]}
+
+
+async def user_processor(request):
+    return {'user': 'user'}
+
+
+async def menu_processor(request):
+    return {'menu': ['a', 'b', 'c']}
+
+
+def make_app(loader, *, default_helpers=True, context_processors=()):
+    app = web.Application()
+    app['name'] = 'Benchmark'
+    env = aiohttp_tal.setup(app, loader=loader,
+                            default_helpers=default_helpers,
+                            context_processors=context_processors)
+    app['static_root_url'] = '/static'
+
+    async def handler(request):
+        return web.Response()
+
+    app.router.add_get('/', handler, name='index')
+    app.router.add_get('/page', handler, name='translation')
+    app.router.add_get('/item/{id}', handler, name='item')
+    if isinstance(loader, dict):
+        env.globals['base'] = env.get_template('base.pt')
+    app.freeze()
+    return app
+
+
+def render_string_scenario(template_name, loader=None, **kwargs):
+    app = make_app(TEMPLATES if loader is None else loader, **kwargs)
+    request = make_mocked_request('GET', '/', app=app)
+    context = make_context(template_name)
+
+    def run():
+        aiohttp_tal.render_string(template_name, request, context)
+    return run
+
+
+def template_scenario(template_name, **kwargs):
+    app = make_app(TEMPLATES, **kwargs)
+    request = make_mocked_request('GET', '/', app=app)
+    context = make_context(template_name)
+
+    @aiohttp_tal.template(template_name)
+    async def func(request):
+        return context
+
+    async def with_middleware(request):
+        return await context_processors_middleware(request, func)
+
+    handler = with_middleware if app.middlewares else func
+
+    async def run():
+        request.pop(REQUEST_CONTEXT_KEY, None)
+        await handler(request)
+    return run
+
+
+SCENARIOS = {
+    'render_string.small': lambda: render_string_scenario('small.pt'),
+    'render_string.medium': lambda: render_string_scenario('medium.pt'),
+    'render_string.huge': lambda: render_string_scenario('huge.pt'),
+    'render_string.layout.mapping': lambda: render_string_scenario(
+        'page.pt'),
+    'render_string.layout.loader': lambda: render_string_scenario(
+        'index.html', chameleon.PageTemplateLoader(str(EXAMPLE_TEMPLATES))),
+    'template.small': lambda: template_scenario('small.pt'),
+    'template.small.no_helpers': lambda: template_scenario(
+        'small.pt', default_helpers=False),
+    'template.small.processors': lambda: template_scenario(
+        'small.pt', context_processors=[
+            aiohttp_tal.request_processor, user_processor, menu_processor]),
+    'template.medium': lambda: template_scenario('medium.pt'),
+    'template.medium.processors': lambda: template_scenario(
+        'medium.pt', context_processors=[
+            aiohttp_tal.request_processor, user_processor, menu_processor]),
+}
+
+
+def _call(loop, run):
+    if asyncio.iscoroutinefunction(run):
+        return lambda: loop.run_until_complete(run())
+    return run
+
+
+def measure(loop, run, duration, min_ops):
+    call = _call(loop, run)
+    # warm up template compilation and caches
+    for i in range(3):
+        call()
+
+    timings = []
+    gc.collect()
+    start = time.perf_counter()
+    while len(timings) < min_ops or time.perf_counter() - start < duration:
+        t = time.perf_counter_ns()
+        call()
+        timings.append(time.perf_counter_ns() - t)
+
+    # peak memory allocated by an operation, traced separately since
+    # tracing slows everything down
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(min(len(timings), 20)):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+
+    def percentile(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))] / 1000
+
+    return {
+        'ops': len(timings),
+        'ops_per_sec': len(timings) / (sum(timings) / 1e9),
+        'p50_us': percentile(0.5),
+        'p90_us': percentile(0.9),
+        'p99_us': percentile(0.99),
+        'peak_kib': statistics.median(peaks) / 1024,
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print()
+    print('{:<32} {:>12} {:>12} {:>8}'.format(
+        'scenario', 'baseline', 'current', 'change'))
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        change = result['ops_per_sec'] / previous['ops_per_sec'] - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(name)
+            flag = ' !'
+        print('{:<32} {:>12.0f} {:>12.0f} {:>+7.1%}{}'.format(
+            name, previous['ops_per_sec'], result['ops_per_sec'], change,
+            flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help='scenarios to run, parts of names match '
+                        '(default: all of them)')
+    parser.add_argument('--duration', type=float, default=1.0,
+                        help='seconds to run each scenario (default: 1)')
+    parser.add_argument('--min-ops', type=int, default=20,
+                        help='least operations of a scenario (default: 20)')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results with a baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown reported as a regression by '
+                        '--compare (default: 0.1)')
+    parser.add_argument('--list', action='store_true',
+                        help='list the scenarios and exit')
+    args = parser.parse_args(argv)
+
+    names = [name for name in SCENARIOS if not args.scenarios or
+             any(part in name for part in args.scenarios)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = {}
+    print('{:<32} {:>12} {:>10} {:>10} {:>10} {:>10}'.format(
+        'scenario', 'ops/sec', 'p50 us', 'p90 us', 'p99 us', 'peak KiB'))
+    try:
+        for name in names:
+            run = SCENARIOS[name]()
+            result = results[name] = measure(
+                loop, run, args.duration, args.min_ops)
+            print('{:<32} {ops_per_sec:>12.0f} {p50_us:>10.1f} '
+                  '{p90_us:>10.1f} {p99_us:>10.1f} {peak_kib:>10.1f}'.format(
+                      name, **result))
+    finally:
+        loop.close()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'chameleon': metadata.version('chameleon'),
+                'aiohttp': metadata.version('aiohttp'),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -28,10 +28,10 @@ async def create_app():
     app = web.Application()
     app.update(name='Testing aiohttp TAL')
 
-    tal_loader = PageTemplateLoader(str(THIS_DIR / 'templates'),
-                                    auto_reload=True  # debugging
-                                    )
-    aiohttp_tal.setup(app, loader=tal_loader)
+    tal_loader = PageTemplateLoader(str(THIS_DIR / 'templates'))
+    aiohttp_tal.setup(app, loader=tal_loader,
+                      reload=True  # debugging
+                      )
 
     app.add_routes([web.static('/static', str(THIS_DIR / 'static'))])
     app['static_root_url'] = '/static'
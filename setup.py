@@ -45,6 +45,9 @@ setup(name='aiohttp-tal',
             'pytest-flake8',
             'flake8-isort',
           ],
+        'reload': [
+            'watchfiles',
+          ],
       },
       include_package_data=True
       )
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+import aiohttp_tal
+from aiohttp_tal.processors import resolve_context
+
+
+async def value(result, delay=0.0):
+    await asyncio.sleep(delay)
+    return result
+
+
+async def fail():
+    raise ValueError('fail')
+
+
+async def test_resolve_context_concurrently():
+    context = {'a': value(1, 0.1), 'b': value(2, 0.1), 'c': 3}
+    start = time.monotonic()
+    resolved = await resolve_context(context)
+    assert time.monotonic() - start < 0.19
+    assert {'a': 1, 'b': 2, 'c': 3} == resolved
+
+
+async def test_resolve_context_unchanged():
+    context = {'a': 1}
+    assert context is await resolve_context(context)
+
+
+async def test_resolve_context_fallbacks():
+    resolved = await resolve_context(
+        {'a': value(1), 'slow': value(2, 10), 'error': fail()},
+        timeout=0.05, fallbacks={'slow': 'slow', 'error': 'error'})
+    assert {'a': 1, 'slow': 'slow', 'error': 'error'} == resolved
+
+    with pytest.raises(asyncio.TimeoutError):
+        await resolve_context({'slow': value(2, 10)}, timeout=0.01)
+    with pytest.raises(ValueError):
+        await resolve_context({'error': fail(), 'a': value(1)})
+
+
+async def test_template_awaitable_context(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt', timeout=0.05,
+                          fallbacks={'news': 'no news'})
+    async def func(request):
+        return {'user': value('user', 0.01),
+                'news': value('news', 10)}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '<p>${user}: ${news}</p>'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert '<p>user: no news</p>' == await resp.text()
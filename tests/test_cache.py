@@ -0,0 +1,177 @@
+import chameleon
+from aiohttp import web
+
+import aiohttp_tal
+
+
+def test_cache_hit():
+    env = aiohttp_tal.Environment({'tmpl.pt': '${text}'})
+
+    template = env.get_template('tmpl.pt')
+    assert template is env.get_template('tmpl.pt')
+
+    info = env.cache_info()
+    assert 1 == info.hits
+    assert 1 == info.misses
+    assert 1 == info.currsize
+
+
+def test_cache_source_changed():
+    loader = {'tmpl.pt': 'first'}
+    env = aiohttp_tal.Environment(loader)
+
+    template = env.get_template('tmpl.pt')
+    loader['tmpl.pt'] = 'second'
+    new_template = env.get_template('tmpl.pt')
+
+    assert template is not new_template
+    assert 'second' == new_template.render()
+    assert 1 == env.cache_info().currsize
+
+
+def test_cache_lru_eviction():
+    env = aiohttp_tal.Environment({'a': 'a', 'b': 'b', 'c': 'c'},
+                                  cache_size=2)
+
+    a = env.get_template('a')
+    env.get_template('b')
+    assert a is env.get_template('a')
+    env.get_template('c')  # evicts b
+
+    info = env.cache_info()
+    assert 1 == info.evictions
+    assert 2 == info.currsize
+    assert a is env.get_template('a')
+    env.get_template('b')
+    assert 4 == env.cache_info().misses
+
+
+def test_cache_disabled():
+    env = aiohttp_tal.Environment({'tmpl.pt': 'tmpl'}, cache_size=0)
+
+    assert env.get_template('tmpl.pt') is not env.get_template('tmpl.pt')
+    assert 0 == env.cache_info().currsize
+
+
+def test_cache_invalidate():
+    env = aiohttp_tal.Environment({'a': 'a', 'b': 'b'})
+    a = env.get_template('a')
+    env.get_template('b')
+
+    env.invalidate('a')
+    assert 1 == env.cache_info().currsize
+    assert a is not env.get_template('a')
+
+    env.invalidate()
+    assert 0 == env.cache_info().currsize
+
+
+def test_setup_cache_size():
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader={'tmpl.pt': 'tmpl'}, cache_size=10)
+
+    assert 10 == env.cache_info().maxsize
+
+
+def test_cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    env = aiohttp_tal.Environment({'tmpl.pt': '<p>${text}</p>'},
+                                  cache_dir=str(cache_dir))
+    assert '<p>a</p>' == env.get_template('tmpl.pt').render(text='a')
+    assert 1 == len(list(cache_dir.glob('*.py')))
+
+    def compile(*args):
+        raise AssertionError('template compiled again')
+
+    monkeypatch.setattr(chameleon.PageTemplate, '_compile', compile)
+    env = aiohttp_tal.Environment({'tmpl.pt': '<p>${text}</p>'},
+                                  cache_dir=str(cache_dir))
+    assert '<p>b</p>' == env.get_template('tmpl.pt').render(text='b')
+
+
+def test_cache_dir_template_loader(tmp_path):
+    (tmp_path / 'tmpl.pt').write_text('<p>${text}</p>')
+    cache_dir = tmp_path / 'cache'
+    env = aiohttp_tal.Environment(
+        chameleon.PageTemplateLoader(str(tmp_path)), cache_dir=str(cache_dir))
+
+    assert '<p>a</p>' == env.get_template('tmpl.pt').render(text='a')
+    assert 1 == len(list(cache_dir.glob('tmpl*.py')))
+
+
+def test_cache_max_bytes():
+    loader = {'small': '<p>${a}</p>',
+              'large': '<p tal:repeat="i range(3)">${i}</p>' * 50}
+    env = aiohttp_tal.Environment(loader, cache_max_bytes=10 ** 9)
+    env.get_template('small')
+    env.get_template('large')
+
+    info = env.cache_info()
+    assert 10 ** 9 == info.maxbytes
+    assert 0 < info.currbytes
+    largest = env.cache_largest()
+    assert ['large', 'small'] == [name for name, size in largest]
+    assert info.currbytes == sum(size for name, size in largest)
+    assert [largest[0]] == env.cache_largest(1)
+
+    env.invalidate('large')
+    assert largest[1][1] == env.cache_info().currbytes
+
+
+def test_cache_max_bytes_eviction():
+    loader = {'a': '<p>${a}</p>', 'b': '<p>${b}</p>', 'c': '<p>${c}</p>'}
+    size = aiohttp_tal.utils.template_footprint(
+        chameleon.PageTemplate(loader['a']))
+    env = aiohttp_tal.Environment(loader, cache_max_bytes=size * 2.5)
+
+    a = env.get_template('a')
+    env.get_template('b')
+    assert a is env.get_template('a')
+    env.get_template('c')  # evicts b
+
+    info = env.cache_info()
+    assert 1 == info.evictions
+    assert 2 == info.currsize
+    assert info.currbytes <= info.maxbytes
+    assert {'a', 'c'} == {name for name, size in env.cache_largest()}
+
+
+def test_cache_max_bytes_too_large():
+    env = aiohttp_tal.Environment({'tmpl.pt': '<p>${a}</p>'},
+                                  cache_max_bytes=1)
+
+    assert env.get_template('tmpl.pt') is not env.get_template('tmpl.pt')
+    info = env.cache_info()
+    assert 0 == info.currsize
+    assert 0 == info.currbytes
+    assert 2 == info.evictions
+
+
+def test_cache_max_bytes_files(tmp_path):
+    for name in 'ab':
+        (tmp_path / (name + '.pt')).write_text('<p>${%s}</p>' % name)
+    loader = chameleon.PageTemplateLoader(str(tmp_path))
+    env = aiohttp_tal.Environment(loader, cache_max_bytes=10 ** 9)
+
+    a = env.get_template('a.pt')
+    assert a is env.get_template('a.pt')
+    env.get_template('b.pt')
+    assert 2 == env.cache_info().currsize
+    assert 0 < env.cache_info().currbytes
+
+    size = env.cache_largest()[0][1]
+    loader = chameleon.PageTemplateLoader(str(tmp_path))
+    env = aiohttp_tal.Environment(loader, cache_max_bytes=size * 1.5)
+    env.get_template('b.pt')
+    env.get_template('a.pt')  # evicts b.pt
+    assert ['a.pt'] == [name for name, size in env.cache_largest()]
+    assert not any(key[0] == 'b.pt' for key in loader.registry)
+    assert '<p>b</p>' == env.get_template('b.pt').render(b='b')
+
+
+def test_setup_cache_max_bytes():
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader={'tmpl.pt': 'tmpl'},
+                            cache_max_bytes=1 << 20)
+
+    assert 1 << 20 == env.cache_info().maxbytes
@@ -0,0 +1,106 @@
+import gzip
+import zlib
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+import aiohttp_tal
+from aiohttp_tal.compression import accepted_encoding, compress_response
+
+
+TEMPLATE = '<p tal:repeat="i range(100)">${text}</p>'
+
+
+def test_accepted_encoding():
+    def encoding(header):
+        request = make_mocked_request('GET', '/', headers={
+            'Accept-Encoding': header})
+        return accepted_encoding(request)
+
+    with mock.patch('aiohttp_tal.compression.ENCODINGS', ('gzip', 'deflate')):
+        assert 'gzip' == encoding('deflate, gzip')
+        assert 'deflate' == encoding('gzip;q=0, deflate')
+        assert 'gzip' == encoding('*')
+        assert encoding('identity') is None
+        assert encoding('') is None
+
+
+def test_compress_response():
+    request = make_mocked_request('GET', '/', headers={
+        'Accept-Encoding': 'deflate'})
+    response = web.Response(body=b'x' * 1000, headers={'ETag': '"tag"'})
+    variants = {}
+    compress_response(request, response, variants)
+
+    assert b'x' * 1000 == zlib.decompress(response.body)
+    assert 'deflate' == response.headers['Content-Encoding']
+    assert 'Accept-Encoding' == response.headers['Vary']
+    assert '"tag-deflate"' == response.headers['ETag']
+    assert {'deflate': response.body} == variants
+
+
+def test_compress_small_response():
+    request = make_mocked_request('GET', '/', headers={
+        'Accept-Encoding': 'gzip'})
+    response = web.Response(body=b'x')
+    compress_response(request, response)
+
+    assert b'x' == response.body
+    assert 'Content-Encoding' not in response.headers
+
+
+async def test_template_compress(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt', compress=True)
+    async def func(request):
+        return {'text': 'text'}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': TEMPLATE})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app, auto_decompress=False)
+
+    resp = await client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert 200 == resp.status
+    assert 'gzip' == resp.headers['Content-Encoding']
+    body = gzip.decompress(await resp.read()).decode('utf-8')
+    assert body.startswith('<p>text</p>')
+
+    resp = await client.get('/', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in resp.headers
+    assert body == await resp.text()
+
+
+async def test_template_compress_cached(aiohttp_client):
+    cache = aiohttp_tal.ResponseCache()
+
+    @aiohttp_tal.template('tmpl.pt', compress=True, cache=cache, etag=True)
+    async def func(request):
+        return {'text': 'text'}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': TEMPLATE})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app, auto_decompress=False)
+
+    headers = {'Accept-Encoding': 'deflate'}
+    resp = await client.get('/', headers=headers)
+    body = await resp.read()
+    etag = resp.headers['ETag']
+    assert etag.endswith('-deflate"')
+
+    entry = cache.get(('tmpl.pt', ('GET', '/')))
+    assert {'deflate': body} == entry.variants
+    assert len(entry.body) + len(body) == cache.size
+
+    with mock.patch('aiohttp_tal.compression.compress') as compress:
+        resp = await client.get('/', headers=headers)
+        assert body == await resp.read()
+        assert not compress.called
+
+    resp = await client.get('/', headers=dict(headers, **{
+        'If-None-Match': etag}))
+    assert 304 == resp.status
@@ -1,6 +1,11 @@
+import asyncio
+
+import chameleon
+import pytest
 from aiohttp import web
 
 import aiohttp_tal
+from aiohttp_tal.processors import run_concurrently
 
 
 async def test_context_processors(aiohttp_client):
@@ -155,3 +160,270 @@ async def test_context_not_tainted(aiohttp_client):
     assert 'foo: 1' == txt
 
     assert 'foo' not in global_context
+
+
+async def test_concurrent_context_processors(aiohttp_client):
+    running = []
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {}
+
+    async def first(request):
+        running.append('first')
+        await asyncio.sleep(0.01)
+        return {'foo': 1, 'bar': 'should be overwriten', 'running': running[:]}
+
+    async def second(request):
+        running.append('second')
+        return {'bar': 2}
+
+    app = web.Application()
+    aiohttp_tal.setup(
+        app,
+        loader={'tmpl.pt': 'foo: ${foo}, bar: ${bar}, ${len(running)}'},
+        context_processors=(first, second),
+        concurrent_processors=True)
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 'foo: 1, bar: 2, 2' == await resp.text()
+
+
+async def test_context_processors_dependencies(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {}
+
+    async def user(request):
+        await asyncio.sleep(0.01)
+        return {'user': 'john'}
+
+    async def greeting(request):
+        user = request['aiohttp_tal_context']['user']
+        return {'greeting': 'hello ' + user}
+
+    app = web.Application()
+    aiohttp_tal.setup(
+        app,
+        loader={'tmpl.pt': '${greeting}'},
+        context_processors=(
+            user,
+            aiohttp_tal.ContextProcessor(greeting, depends=[user])),
+        concurrent_processors=True)
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 'hello john' == await resp.text()
+
+
+async def test_context_processors_bad_dependency():
+
+    async def first(request):
+        return {}
+
+    async def second(request):
+        return {}
+
+    processors = (aiohttp_tal.ContextProcessor(first, depends=[second]),
+                  second)
+    with pytest.raises(ValueError, match='not an earlier context processor'):
+        await run_concurrently(processors, None, {})
+
+
+async def test_context_processor_timeout(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {}
+
+    async def slow(request):
+        await asyncio.sleep(10)
+        return {'foo': 'slow'}
+
+    app = web.Application()
+    aiohttp_tal.setup(
+        app,
+        loader={'tmpl.pt': 'foo: ${foo}'},
+        context_processors=(aiohttp_tal.ContextProcessor(
+            slow, timeout=0.01, fallback={'foo': 'fallback'}),))
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 'foo: fallback' == await resp.text()
+
+
+async def test_context_processor_timeout_without_fallback():
+
+    async def slow(request):
+        await asyncio.sleep(10)
+
+    processor = aiohttp_tal.ContextProcessor(slow, timeout=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        await processor(None)
+
+
+async def test_lazy_context_processors(aiohttp_client):
+    calls = []
+
+    @aiohttp_tal.template('user.pt')
+    async def user_page(request):
+        return {}
+
+    @aiohttp_tal.template('plain.pt')
+    async def plain_page(request):
+        return {}
+
+    async def json_page(request):
+        return web.json_response({})
+
+    async def user(request):
+        calls.append('user')
+        return {'user': 'john'}
+
+    async def menu(request):
+        calls.append('menu')
+        return {'menu': 'menu'}
+
+    app = web.Application()
+    aiohttp_tal.setup(
+        app,
+        loader={'user.pt': 'user: ${user.upper()}', 'plain.pt': 'plain'},
+        context_processors=(
+            aiohttp_tal.ContextProcessor(user, provides=['user']),
+            aiohttp_tal.ContextProcessor(menu, provides=['menu'])))
+
+    app.router.add_get('/user', user_page)
+    app.router.add_get('/plain', plain_page)
+    app.router.add_get('/json', json_page)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/json')
+    assert 200 == resp.status
+    assert [] == calls
+
+    resp = await client.get('/plain')
+    assert 'plain' == await resp.text()
+    assert [] == calls
+
+    resp = await client.get('/user')
+    assert 'user: JOHN' == await resp.text()
+    assert ['user'] == calls
+
+
+async def test_lazy_context_processors_depends(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {}
+
+    async def site(request):
+        return {'site': 'site'}
+
+    async def user(request):
+        await asyncio.sleep(0.01)
+        return {'user': 'john'}
+
+    async def greeting(request):
+        context = request['aiohttp_tal_context']
+        return {'greeting': 'hi {} on {}'.format(
+            context.get('user', 'MISSING'), context['site'])}
+
+    app = web.Application()
+    aiohttp_tal.setup(
+        app,
+        loader={'tmpl.pt': '${greeting}'},
+        context_processors=(
+            site,
+            aiohttp_tal.ContextProcessor(user, provides=['user']),
+            aiohttp_tal.ContextProcessor(greeting, depends=[user, site],
+                                         provides=['greeting'])))
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 'hi john on site' == await resp.text()
+
+
+async def test_lazy_context_processors_async_render(aiohttp_client):
+
+    async def func(request):
+        return await aiohttp_tal.render_template_async('tmpl.pt', request, {})
+
+    async def user(request):
+        return {'user': 'john'}
+
+    app = web.Application()
+    aiohttp_tal.setup(
+        app,
+        loader={'tmpl.pt': '${user}'},
+        context_processors=(
+            aiohttp_tal.ContextProcessor(user, provides=['user']),))
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 'john' == await resp.text()
+
+
+def test_referenced_names(tmp_path):
+    (tmp_path / 'base.pt').write_text(
+        '<html metal:define-macro="master">'
+        '${site}<div metal:define-slot="content"/></html>')
+    (tmp_path / 'page.pt').write_text(
+        '<html metal:use-macro="load: base.pt">'
+        '<div metal:fill-slot="content" tal:define="x python: user.name">'
+        '${x}</div></html>')
+    (tmp_path / 'dynamic.pt').write_text(
+        '<html metal:use-macro="load: ${layout}"></html>')
+    env = aiohttp_tal.Environment(
+        chameleon.PageTemplateLoader(str(tmp_path)))
+
+    names = env.referenced_names('page.pt')
+    assert {'site', 'user', 'x'} <= names
+    assert 'other' not in names
+    assert env.referenced_names('dynamic.pt') is None
+
+
+async def test_lazy_context_processors_sync_render(aiohttp_client):
+
+    async def user_page(request):
+        return aiohttp_tal.render_template('user.pt', request, {})
+
+    async def plain_page(request):
+        return aiohttp_tal.render_template('plain.pt', request, {})
+
+    async def user(request):
+        return {'user': 'john'}
+
+    app = web.Application()
+    aiohttp_tal.setup(
+        app,
+        loader={'user.pt': '${user}', 'plain.pt': 'plain'},
+        context_processors=(
+            aiohttp_tal.ContextProcessor(user, provides=['user']),))
+
+    app.router.add_get('/user', user_page)
+    app.router.add_get('/plain', plain_page)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/plain')
+    assert 'plain' == await resp.text()
+
+    resp = await client.get('/user')
+    assert 500 == resp.status
+    assert ("Template 'user.pt' uses names of lazy context processors "
+            "(user), render it with the template decorator or an "
+            "asynchronous rendering function") == await resp.text()
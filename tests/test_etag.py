@@ -0,0 +1,98 @@
+from aiohttp import web
+
+import aiohttp_tal
+
+
+async def test_template_etag(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt', etag=True)
+    async def func(request):
+        return {'text': 'text'}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '<p>${text}</p>'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    etag = resp.headers['ETag']
+    assert etag.startswith('"')
+
+    resp = await client.get('/', headers={'If-None-Match': etag})
+    assert 304 == resp.status
+    assert etag == resp.headers['ETag']
+    assert b'' == await resp.read()
+
+    resp = await client.get('/', headers={'If-None-Match': '"other", W/' +
+                                          etag})
+    assert 304 == resp.status
+
+    resp = await client.get('/', headers={'If-None-Match': '"other"'})
+    assert 200 == resp.status
+    assert '<p>text</p>' == await resp.text()
+
+
+async def test_template_version(aiohttp_client):
+    calls = []
+
+    @aiohttp_tal.template('tmpl.pt', version=lambda request: 42)
+    async def func(request):
+        calls.append(request)
+        return {}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': 'tmpl'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    etag = resp.headers['ETag']
+
+    resp = await client.get('/', headers={'If-None-Match': etag})
+    assert 304 == resp.status
+    assert 1 == len(calls)
+
+
+async def test_render_template_etag_with_cache(aiohttp_client):
+    cache = aiohttp_tal.ResponseCache()
+
+    async def func(request):
+        return aiohttp_tal.render_template('tmpl.pt', request, {},
+                                           cache=cache, etag=True)
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': 'tmpl'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    etag = resp.headers['ETag']
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert etag == resp.headers['ETag']
+
+    resp = await client.get('/', headers={'If-None-Match': etag})
+    assert 304 == resp.status
+
+
+async def test_render_template_version_not_rendered(aiohttp_client):
+
+    async def func(request):
+        return aiohttp_tal.render_template('missing.pt', request, {},
+                                           version=1)
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    etag = aiohttp_tal.cache.version_etag('missing.pt', 1)
+    resp = await client.get('/', headers={'If-None-Match': etag})
+    assert 304 == resp.status
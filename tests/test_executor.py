@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import aiohttp_tal
+
+
+def thread_name():
+    return threading.current_thread().name
+
+
+async def test_render_template_async(aiohttp_client):
+
+    async def func(request):
+        return await aiohttp_tal.render_template_async(
+            'tmpl.pt', request, {'head': 'HEAD'})
+
+    app = web.Application()
+    executor = ThreadPoolExecutor(thread_name_prefix='render')
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '<h1>${head}</h1>${name()}'},
+                      filters={'name': thread_name}, executor=executor)
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    txt = await resp.text()
+    assert txt.startswith('<h1>HEAD</h1>render')
+    executor.shutdown()
+
+
+async def test_render_inline_below_threshold(aiohttp_client):
+
+    async def func(request):
+        return web.Response(text=await aiohttp_tal.render_string_async(
+            'tmpl.pt', request, {}))
+
+    app = web.Application()
+    executor = ThreadPoolExecutor(thread_name_prefix='render')
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '${name()}'},
+                      filters={'name': thread_name}, executor=executor,
+                      inline_threshold=100)
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert (await resp.text()).startswith('render')
+    # output size is now known to be under the threshold
+    resp = await client.get('/')
+    assert 'MainThread' == await resp.text()
+    executor.shutdown()
+
+
+async def test_template_executor(aiohttp_client):
+    executor = ThreadPoolExecutor(thread_name_prefix='decorator')
+
+    @aiohttp_tal.template('tmpl.pt', executor=executor, status=201)
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '${name()}'},
+                      filters={'name': thread_name})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 201 == resp.status
+    assert (await resp.text()).startswith('decorator')
+    executor.shutdown()
@@ -1,7 +1,15 @@
+import re
+import threading
+from collections import OrderedDict
+from unittest import mock
+
+import chameleon
 import pytest
 from aiohttp import web
 
 import aiohttp_tal
+from aiohttp_tal.helpers import UrlBuilder
+from aiohttp_tal.utils import render_scope
 
 
 def test_get_env():
@@ -155,3 +163,212 @@ async def test_static_var_missing(aiohttp_client, caplog):
 
     resp = await client.get('/')
     assert 200 == resp.status  # static_root_url is not set
+
+
+def test_namespace():
+    env = aiohttp_tal.Environment({})
+    env.globals['a'] = 1
+    env.filters['b'] = 2
+
+    namespace = env.namespace
+    assert {'a': 1, 'b': 2} == namespace
+    assert namespace is env.namespace
+
+    env.globals.update(c=3)
+    assert {'a': 1, 'b': 2, 'c': 3} == env.namespace
+    del env.filters['b']
+    assert {'a': 1, 'c': 3} == env.namespace
+    env.filters = {'d': 4}
+    assert {'a': 1, 'c': 3, 'd': 4} == env.namespace
+
+
+def test_render_scope():
+    base = chameleon.PageTemplate(
+        '<html metal:define-macro="master">${site} '
+        '<div metal:define-slot="content"/></html>')
+    template = chameleon.PageTemplate(
+        '<html metal:use-macro="base.macros[\'master\']">'
+        '<div metal:fill-slot="content" tal:define="global site title">'
+        '${site} ${up(title)} <i tal:repeat="i items">${repeat.i.index}</i>'
+        '</div></html>')
+    namespace = {'site': 'site', 'up': str.upper, 'base': base}
+    context = {'title': 'page', 'items': 'ab'}
+
+    output = render_scope(template, namespace, ({'items': ''}, context))
+    assert template.render(**namespace, **context) == output
+    assert 'site <div>page PAGE <i>0</i>' in output
+    assert {'site': 'site', 'up': str.upper, 'base': base} == namespace
+    assert {'title': 'page', 'items': 'ab'} == context
+
+
+def test_render_scope_error():
+    template = chameleon.PageTemplate('<p>${missing}</p>')
+
+    with pytest.raises(NameError) as exc_info:
+        render_scope(template, {'a': 1})
+    assert '- Expression: "missing"' in str(exc_info.value)
+
+
+
+def translate(msgid, mapping=None, default=None, target_language=None,
+              **kwargs):
+    text = default if default is not None else msgid
+    for key, value in (mapping or {}).items():
+        text = text.replace('${%s}' % key, str(value))
+    return '[{}] {}'.format(target_language, text)
+
+
+BASE = chameleon.PageTemplate(
+    '<html metal:define-macro="master"><p>${site}</p>'
+    '<div metal:define-slot="content"/></html>')
+
+RENDER_TEMPLATES = {
+    'macro': '<html metal:use-macro="base.macros.master">'
+             '<div metal:fill-slot="content">${title}</div></html>',
+    'on-error': '<p tal:on-error="string:failed ${error.type.__name__}">'
+                '${missing}</p><p>${title}</p>',
+    'on-error-macro': '<html metal:use-macro="base.macros.master">'
+                      '<div metal:fill-slot="content"><p '
+                      'tal:on-error="string:failed">${1 / 0}</p></div>'
+                      '</html>',
+    'i18n': '<p i18n:translate="">Hello <b i18n:name="name">${title}</b></p>'
+            '<img alt="Logo" i18n:attributes="alt" />'
+            '<i i18n:translate="">${up(site)}</i>',
+    'repeat': '<i tal:repeat="i items">${repeat.i.number}${i}</i>',
+    'error': '<p>${title}</p><p>${missing}</p>',
+    'error-macro': '<html metal:use-macro="base.macros.master">'
+                   '<div metal:fill-slot="content">${1 / 0}</div></html>',
+}
+
+
+@pytest.mark.parametrize('name', sorted(RENDER_TEMPLATES))
+@pytest.mark.parametrize('target_language', [None, 'ca'])
+def test_render_scope_like_render(name, target_language):
+    # render_scope copies how Chameleon renders, check it still agrees
+    template = chameleon.PageTemplate(RENDER_TEMPLATES[name])
+    namespace = {'site': 'site', 'up': str.upper, 'base': BASE}
+    context = {'title': 'page', 'items': 'ab', 'translate': translate}
+    if target_language is not None:
+        context['target_language'] = target_language
+
+    try:
+        expected = template.render(**namespace, **context)
+    except Exception as exc:
+        # formatted errors are of classes created on the fly
+        with pytest.raises(Exception) as exc_info:
+            render_scope(template, namespace, (context,))
+        assert type(exc).__mro__[1:] == type(exc_info.value).__mro__[1:]
+        # without the addresses of objects
+        assert (re.sub(' at 0x[0-9a-f]+', '', str(exc)) ==
+                re.sub(' at 0x[0-9a-f]+', '', str(exc_info.value)))
+    else:
+        assert expected == render_scope(template, namespace, (context,))
+
+
+async def test_context_overrides_global(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def index(request):
+        return {'title': 'page'}
+
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader={'tmpl.pt': "${title}"})
+    env.globals['title'] = 'site'
+
+    app.router.add_route('GET', '/', index)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 'page' == await resp.text()
+
+
+async def test_url_builder(aiohttp_client):
+
+    async def other(request):
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_get('/uid/{arg}', other, name='other')
+    url = UrlBuilder(app)
+
+    first = url('other', arg=1)
+    assert '/uid/1' == str(first)
+    assert first is url('other', arg=1)
+    assert '/uid/1?a=b' == str(url('other', arg=1, query_={'a': 'b'}))
+    with pytest.raises(TypeError, match='argument value should be'):
+        url('other', arg=True)
+
+    await aiohttp_client(app)  # freezes the router
+    assert first is url('other', arg=1)
+    assert ['/uid/1', '/uid/x?page=2'] == [str(u) for u in url.many(
+        'other', [{'arg': 1}, {'arg': 'x', 'query_': {'page': 2}}])]
+
+
+def test_url_builder_maxsize():
+
+    async def other(request):
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_get('/uid/{arg}', other, name='other')
+    url = UrlBuilder(app, maxsize=2)
+
+    with mock.patch.object(UrlBuilder, '_build',
+                           side_effect=UrlBuilder._build,
+                           autospec=True) as build:
+        url('other', arg=1)
+        url('other', arg=2)
+        url('other', arg=2)
+        assert 2 == build.call_count
+        url('other', arg=3)
+        url('other', arg=1)
+        assert 4 == build.call_count
+
+
+def test_url_builder_threads():
+
+    async def other(request):
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_get('/uid/{arg}', other, name='other')
+    url = UrlBuilder(app)
+
+    class Cache(OrderedDict):
+
+        def get(self, key, default=None):
+            value = super().get(key, default)
+            # another rendering thread clears the cache meanwhile
+            thread = threading.Thread(target=url.cache_clear)
+            thread.start()
+            thread.join(0.05)
+            return value
+
+    url('other', arg=1)
+    url._cache = Cache(url._cache)
+    assert '/uid/1' == str(url('other', arg=1))
+    assert '/uid/2' == str(url('other', arg=2))
+
+
+async def test_url_many(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def index(request):
+        return {'items': [{'arg': 1}, {'arg': 2}]}
+
+    async def other(request):
+        return web.Response()
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={
+        'tmpl.pt': "<a tal:repeat=\"u url.many('other', items)\" "
+                   "href=\"${u}\"></a>"})
+
+    app.router.add_get('/', index)
+    app.router.add_get('/uid/{arg}', other, name='other')
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert '<a href="/uid/1"></a>\n<a href="/uid/2"></a>' == await resp.text()
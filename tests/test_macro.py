@@ -0,0 +1,79 @@
+import chameleon
+from aiohttp import web
+
+import aiohttp_tal
+
+
+async def test_template_macro(aiohttp_client, tmp_path):
+    (tmp_path / 'base.pt').write_text(
+        '<html metal:define-macro="master"><h1>Layout</h1>'
+        '<div metal:define-slot="content"/></html>')
+    (tmp_path / 'page.pt').write_text(
+        '<html metal:use-macro="load: base.pt">'
+        '<div metal:fill-slot="content">'
+        '<ul metal:define-macro="items"><li tal:repeat="i items">${i}</li>'
+        '</ul></div></html>')
+
+    def fragment(request):
+        return 'items' if 'HX-Request' in request.headers else None
+
+    @aiohttp_tal.template('page.pt', macro=fragment)
+    async def func(request):
+        return {'items': [1, 2]}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader=chameleon.PageTemplateLoader(
+        str(tmp_path)))
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert '<h1>Layout</h1>' in await resp.text()
+
+    resp = await client.get('/', headers={'HX-Request': 'true'})
+    assert 200 == resp.status
+    assert '<ul><li>1</li>\n<li>2</li></ul>' == await resp.text()
+
+
+async def test_render_template_macro(aiohttp_client):
+
+    async def func(request):
+        return aiohttp_tal.render_template(
+            'tmpl.pt', request, {'name': 'name'}, macro='hello')
+
+    async def async_func(request):
+        return await aiohttp_tal.render_template_async(
+            'tmpl.pt', request, {'name': 'name'}, macro='hello')
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={
+        'tmpl.pt': '<div><p metal:define-macro="hello">Hello ${name}</p>'
+                   '</div>'})
+
+    app.router.add_get('/', func)
+    app.router.add_get('/async', async_func)
+    client = await aiohttp_client(app)
+
+    for path in ('/', '/async'):
+        resp = await client.get(path)
+        assert 200 == resp.status
+        assert '<p>Hello name</p>' == await resp.text()
+
+
+async def test_render_macro_not_found(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt', macro='missing')
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '<p></p>'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 500 == resp.status
+    assert "Template 'tmpl.pt#missing' not found" == await resp.text()
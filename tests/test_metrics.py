@@ -0,0 +1,117 @@
+import chameleon
+from aiohttp import web
+
+import aiohttp_tal
+from aiohttp_tal.metrics import TemplateMetrics
+
+
+async def test_instruments(aiohttp_client):
+    events = []
+
+    def instrument(event, template_name, seconds, size):
+        assert seconds >= 0
+        events.append((event, template_name, size))
+
+    async def processor(request):
+        return {'title': 'title'}
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader={'tmpl.pt': '<h1>${title}</h1>'},
+                            context_processors=[processor])
+    env.instruments.append(instrument)
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+    # looked up once the application starts
+    assert [
+        ('lookup', 'tmpl.pt', None),
+        ('compile', 'tmpl.pt', None),
+    ] == events
+
+    del events[:]
+    resp = await client.get('/')
+    assert '<h1>title</h1>' == await resp.text()
+    assert [
+        ('context', 'tmpl.pt', None),
+        ('lookup', 'tmpl.pt', None),
+        ('render', 'tmpl.pt', 14),
+        ('encode', 'tmpl.pt', 14),
+    ] == events
+
+    del events[:]
+    env.invalidate()
+    await client.get('/')
+    assert ['context', 'lookup', 'compile', 'render', 'encode'] == [
+        event for event, name, size in events]
+
+
+def test_instruments_compile_template_file(tmp_path):
+    (tmp_path / 'tmpl.pt').write_text('<p>${1 + 1}</p>')
+    env = aiohttp_tal.Environment(chameleon.PageTemplateLoader(str(tmp_path)))
+    events = []
+    env.instruments.append(
+        lambda event, template_name, seconds, size: events.append(event))
+
+    env.get_template('tmpl.pt')
+    env.get_template('tmpl.pt')
+    assert ['lookup', 'compile', 'lookup'] == events
+
+
+def test_metrics_render():
+    metrics = TemplateMetrics(buckets=(0.01, 0.1))
+    metrics('render', 'a"b.pt', 0.05, 100)
+    metrics('render', 'a"b.pt', 0.5, 50)
+    metrics('lookup', 'a"b.pt', 0.001)
+
+    assert metrics.render() == '\n'.join([
+        '# HELP aiohttp_tal_seconds Time spent by templates in each event.',
+        '# TYPE aiohttp_tal_seconds histogram',
+        'aiohttp_tal_seconds_bucket{event="lookup",template="a\\"b.pt",'
+        'le="0.01"} 1',
+        'aiohttp_tal_seconds_bucket{event="lookup",template="a\\"b.pt",'
+        'le="0.1"} 1',
+        'aiohttp_tal_seconds_bucket{event="lookup",template="a\\"b.pt",'
+        'le="+Inf"} 1',
+        'aiohttp_tal_seconds_sum{event="lookup",template="a\\"b.pt"} 0.001',
+        'aiohttp_tal_seconds_count{event="lookup",template="a\\"b.pt"} 1',
+        'aiohttp_tal_seconds_bucket{event="render",template="a\\"b.pt",'
+        'le="0.01"} 0',
+        'aiohttp_tal_seconds_bucket{event="render",template="a\\"b.pt",'
+        'le="0.1"} 1',
+        'aiohttp_tal_seconds_bucket{event="render",template="a\\"b.pt",'
+        'le="+Inf"} 2',
+        'aiohttp_tal_seconds_sum{event="render",template="a\\"b.pt"} 0.55',
+        'aiohttp_tal_seconds_count{event="render",template="a\\"b.pt"} 2',
+        '# HELP aiohttp_tal_output_bytes_total Size of the rendered output.',
+        '# TYPE aiohttp_tal_output_bytes_total counter',
+        'aiohttp_tal_output_bytes_total{template="a\\"b.pt"} 150',
+    ]) + '\n'
+
+
+async def test_metrics_handler(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader={'tmpl.pt': '<p>Hello</p>'})
+    metrics = aiohttp_tal.TemplateMetrics()
+    env.instruments.append(metrics)
+
+    app.router.add_get('/', func)
+    app.router.add_get('/metrics', metrics.handle)
+    client = await aiohttp_client(app)
+
+    await client.get('/')
+    resp = await client.get('/metrics')
+    assert 200 == resp.status
+    assert resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    text = await resp.text()
+    assert ('aiohttp_tal_seconds_count{event="render",template="tmpl.pt"} 1'
+            in text)
+    assert 'aiohttp_tal_output_bytes_total{template="tmpl.pt"} 12' in text
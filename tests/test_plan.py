@@ -0,0 +1,149 @@
+from aiohttp import web
+
+import aiohttp_tal
+
+
+async def test_plan_built_on_startup(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {'text': 'OK'}
+
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader={'tmpl.pt': '<p>${text}</p>'})
+    app.router.add_get('/', func)
+
+    client = await aiohttp_client(app)
+    # compiled on startup
+    assert (0, 1) == env.cache_info()[:2]
+
+    for i in range(3):
+        resp = await client.get('/')
+        assert '<p>OK</p>' == await resp.text()
+        assert 'text/html; charset=utf-8' == resp.headers['Content-Type']
+    assert (3, 1) == env.cache_info()[:2]
+
+
+async def test_plan_source_changed(aiohttp_client):
+    loader = {'tmpl.pt': '<p>${text}</p>'}
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {'text': 'OK'}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader=loader)
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert '<p>OK</p>' == await resp.text()
+
+    loader['tmpl.pt'] = '<b>${text}</b>'
+    resp = await client.get('/')
+    assert '<b>OK</b>' == await resp.text()
+
+
+async def test_plan_keeps_templates_recently_used(aiohttp_client):
+    loader = {'a.pt': 'a', 'b.pt': 'b', 'c.pt': 'c'}
+
+    @aiohttp_tal.template('a.pt')
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader=loader, cache_size=2)
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    env.get_template('b.pt')
+    resp = await client.get('/')
+    assert 'a' == await resp.text()
+    env.get_template('c.pt')  # evicts b.pt, a.pt was used last
+
+    resp = await client.get('/')
+    assert 'a' == await resp.text()
+    # a.pt was not compiled again
+    assert (2, 3, 1) == env.cache_info()[:3]
+
+
+async def test_plan_class_based_view(aiohttp_client):
+
+    class MyView(web.View):
+
+        @aiohttp_tal.template('tmpl.pt')
+        async def get(self):
+            return {'text': 'OK'}
+
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader={'tmpl.pt': '${text}'})
+    app.router.add_view('/', MyView)
+
+    client = await aiohttp_client(app)
+    assert 1 == env.cache_info().currsize
+
+    resp = await client.get('/')
+    assert 'OK' == await resp.text()
+    assert (1, 1) == env.cache_info()[:2]
+
+
+async def test_plan_app_key(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt', app_key='other')
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader={'tmpl.pt': 'default'})
+    other = aiohttp_tal.setup(app, loader={'tmpl.pt': 'other'},
+                              app_key='other')
+    app.router.add_get('/', func)
+
+    client = await aiohttp_client(app)
+    assert 0 == env.cache_info().currsize
+    assert 1 == other.cache_info().currsize
+
+    resp = await client.get('/')
+    assert 'other' == await resp.text()
+
+
+async def test_plan_missing_template(aiohttp_client):
+
+    @aiohttp_tal.template('missing.pt')
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={})
+    app.router.add_get('/', func)
+
+    client = await aiohttp_client(app)
+    resp = await client.get('/')
+    assert 500 == resp.status
+    assert "Template 'missing.pt' not found" == await resp.text()
+
+
+async def test_plan_broken_template(aiohttp_client):
+
+    @aiohttp_tal.template('broken.pt')
+    async def broken(request):
+        return {}
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={
+        'broken.pt': '<p tal:content="a b c d"></p>',
+        'tmpl.pt': '<p>ok</p>'})
+    app.router.add_get('/broken', broken)
+    app.router.add_get('/', func)
+
+    client = await aiohttp_client(app)
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert '<p>ok</p>' == await resp.text()
+
+    resp = await client.get('/broken')
+    assert 500 == resp.status
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import chameleon
+from aiohttp import web
+
+import aiohttp_tal
+
+
+def test_list_templates_mapping():
+    env = aiohttp_tal.Environment({'b.pt': 'b', 'a.pt': 'a'})
+
+    assert ['a.pt', 'b.pt'] == env.list_templates()
+
+
+def test_list_templates_loader(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'b.pt').write_text('b')
+    (tmp_path / 'a.pt').write_text('a')
+    (tmp_path / 'notes.txt').write_text('not a template')
+    (tmp_path / '.hidden.pt').write_text('hidden')
+
+    env = aiohttp_tal.Environment(
+        chameleon.PageTemplateLoader(str(tmp_path), '.pt'))
+
+    assert ['a.pt', 'sub/b.pt'] == env.list_templates()
+
+
+async def test_precompile():
+    env = aiohttp_tal.Environment({'ok.pt': '${ok}', 'bad.pt': '${1 +}'})
+
+    results = {r.name: r for r in await env.precompile()}
+
+    assert results['ok.pt'].error is None
+    assert results['ok.pt'].seconds >= 0
+    assert isinstance(results['bad.pt'].error, chameleon.exc.TemplateError)
+    assert 1 == env.cache_info().currsize
+
+
+async def test_precompile_executor(tmp_path):
+    (tmp_path / 'a.pt').write_text('a')
+    (tmp_path / 'b.pt').write_text('b')
+    env = aiohttp_tal.Environment(
+        chameleon.PageTemplateLoader(str(tmp_path)))
+
+    with ThreadPoolExecutor() as executor:
+        results = await env.precompile(executor=executor)
+
+    assert [None, None] == [r.error for r in results]
+    assert env.get_template('a.pt')._cooked
+
+
+async def test_setup_precompile(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    env = aiohttp_tal.setup(app, loader={'tmpl.pt': 'tmpl'}, precompile=True)
+    app.router.add_get('/', func)
+
+    await aiohttp_client(app)
+    # compiled once, then looked up by the render plan of the handler
+    assert (1, 1) == env.cache_info()[:2]
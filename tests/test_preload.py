@@ -0,0 +1,151 @@
+import asyncio
+import threading
+
+import chameleon
+from aiohttp import web
+
+import aiohttp_tal
+from aiohttp_tal.preload import load_preload_header, preload_header
+
+
+def make_app(tmp_path, **kwargs):
+    (tmp_path / 'base.pt').write_text(
+        '<html metal:define-macro="master"><head>'
+        '<link rel="stylesheet" href="${static(\'style.css\')}" />'
+        '<script src="${static(\'app.js\')}"></script></head>'
+        '<body metal:define-slot="body"/></html>')
+    (tmp_path / 'page.pt').write_text(
+        '<html metal:use-macro="load: base.pt">'
+        '<body metal:fill-slot="body">'
+        '<img tal:attributes="src static(\'logo.png\')" />'
+        '<a href="${static(\'data.json\')}">${data}</a></body></html>')
+
+    @aiohttp_tal.template('page.pt', **kwargs)
+    async def func(request):
+        return {'data': request.app['data']()}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader=chameleon.PageTemplateLoader(
+        str(tmp_path)))
+    app['static_root_url'] = '/static'
+    app['data'] = lambda: 'data'
+    app.router.add_get('/', func)
+    return app
+
+
+LINK = ('</static/style.css>; rel=preload; as=style, '
+        '</static/app.js>; rel=preload; as=script, '
+        '</static/logo.png>; rel=preload; as=image')
+
+
+def test_static_assets(tmp_path):
+    app = make_app(tmp_path)
+    env = aiohttp_tal.get_env(app)
+    assert ('style.css', 'app.js', 'logo.png', 'data.json') == (
+        env.static_assets('page.pt'))
+
+
+def test_preload_header_without_static_root_url(tmp_path):
+    app = make_app(tmp_path)
+    del app['static_root_url']
+    env = aiohttp_tal.get_env(app)
+    assert preload_header(env, 'page.pt') is None
+
+
+
+async def test_load_preload_header(tmp_path):
+    app = make_app(tmp_path)
+    env = aiohttp_tal.get_env(app)
+    scan = env._scan
+    threads = []
+
+    def scan_in_thread(name):
+        threads.append(threading.current_thread())
+        return scan(name)
+
+    env._scan = scan_in_thread
+    assert LINK == await load_preload_header(env, 'page.pt')
+    assert threads
+    assert threading.main_thread() not in threads
+
+    del threads[:]
+    assert LINK == await load_preload_header(env, 'page.pt')
+    assert [] == threads
+
+
+async def test_template_preload(aiohttp_client, tmp_path):
+    client = await aiohttp_client(make_app(tmp_path, preload=True))
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert LINK == resp.headers['Link']
+
+
+
+async def test_template_preload_scanned_on_startup(aiohttp_client, tmp_path):
+    app = make_app(tmp_path, preload=True)
+    env = aiohttp_tal.get_env(app)
+    client = await aiohttp_client(app)
+    scan = env._scan
+    scanned = []
+
+    def scan_off_requests(name):
+        scanned.append(name)
+        return scan(name)
+
+    env._scan = scan_off_requests
+    resp = await client.get('/')
+    assert LINK == resp.headers['Link']
+    assert [] == scanned
+
+    # as the template watcher does
+    (tmp_path / 'base.pt').write_text(
+        '<html metal:define-macro="master"><head>'
+        '<link rel="stylesheet" href="${static(\'new.css\')}" /></head>'
+        '<body metal:define-slot="body"/></html>')
+    env.invalidate_files([str(tmp_path / 'base.pt')])
+    assert scanned
+    del scanned[:]
+
+    resp = await client.get('/')
+    assert ('</static/new.css>; rel=preload; as=style, '
+            '</static/logo.png>; rel=preload; as=image') == (
+        resp.headers['Link'])
+    assert [] == scanned
+
+
+async def test_template_early_hints(aiohttp_client, tmp_path):
+    client = await aiohttp_client(make_app(tmp_path, early_hints=True))
+
+    reader, writer = await asyncio.open_connection(
+        client.server.host, client.server.port)
+    writer.write(b'GET / HTTP/1.1\r\nHost: localhost\r\n'
+                 b'Connection: close\r\n\r\n')
+    data = await reader.read()
+    writer.close()
+
+    hints = 'HTTP/1.1 103 Early Hints\r\nLink: {}\r\n\r\n'.format(LINK)
+    assert data.startswith(hints.encode('latin-1'))
+    assert b'HTTP/1.1 200 OK\r\n' in data
+
+    # clients skip informational responses
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 'Link' not in resp.headers
+
+
+async def test_stream_headers_before_data(aiohttp_client, tmp_path):
+    app = make_app(tmp_path, stream=True, preload=True)
+    ready = asyncio.Event()
+
+    async def data():
+        await ready.wait()
+        return 'data'
+
+    app['data'] = data
+    client = await aiohttp_client(app)
+
+    resp = await asyncio.wait_for(client.get('/'), 1)
+    assert LINK == resp.headers['Link']
+    ready.set()
+    assert '<a href="/static/data.json">data</a>' in await resp.text()
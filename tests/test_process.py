@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import pickle
+
+import chameleon
+import pytest
+from aiohttp import web
+
+import aiohttp_tal
+from aiohttp_tal.exceptions import TemplateNotFound
+
+
+def pid():
+    return os.getpid()
+
+
+async def test_render_in_process(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def index(request):
+        return {'text': 'text'}
+
+    async def other(request):
+        return web.Response()
+
+    app = web.Application()
+    app['name'] = 'App'
+    app['static_root_url'] = '/static'
+    aiohttp_tal.setup(app, processes=1, filters={'pid': pid}, loader={
+        'tmpl.pt': "${app['name']} ${text} ${url('other', id=1)} "
+                   "${url('static', filename='a/b.css')} "
+                   "${static('main.js')} ${pid()}"})
+
+    app.router.add_get('/', index)
+    app.router.add_get('/other/{id:\\d+}', other, name='other')
+    app.router.add_static('/files', os.path.dirname(__file__), name='static')
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    txt = await resp.text()
+    app_name, text, url, static_file, static, worker = txt.split()
+    assert 'App' == app_name
+    assert 'text' == text
+    assert '/other/1' == url
+    assert '/files/a/b.css' == static_file
+    assert '/static/main.js' == static
+    assert str(os.getpid()) != worker
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason="workers do not inherit patches")
+async def test_render_in_process_cache_dir(aiohttp_client, tmp_path,
+                                           monkeypatch):
+    cache_dir = tmp_path / 'cache'
+
+    async def func(request):
+        return await aiohttp_tal.render_template_async(
+            'tmpl.pt', request, {'text': 'text'})
+
+    app = web.Application()
+    env = aiohttp_tal.setup(app, processes=1, cache_dir=str(cache_dir),
+                            loader={'tmpl.pt': '<p>${text}</p>'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+    env.get_template('tmpl.pt')
+    assert 1 == len(list(cache_dir.glob('*.py')))
+
+    def compile(*args):
+        raise AssertionError('template compiled again')
+
+    # inherited by forked workers
+    monkeypatch.setattr(chameleon.PageTemplate, '_compile', compile)
+    resp = await client.get('/')
+    assert '<p>text</p>' == await resp.text()
+
+
+async def test_render_in_process_not_found(aiohttp_client):
+
+    async def func(request):
+        return await aiohttp_tal.render_template_async('missing.pt', request,
+                                                       {})
+
+    app = web.Application()
+    aiohttp_tal.setup(app, processes=1, loader={})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 500 == resp.status
+    assert "Template 'missing.pt' not found" == await resp.text()
+
+
+def test_template_not_found_pickle():
+    e = pickle.loads(pickle.dumps(TemplateNotFound('tmpl.pt')))
+    assert 'tmpl.pt' == e.name
+
+
+async def test_render_in_process_unpicklable(aiohttp_client):
+
+    @aiohttp_tal.template('plain.pt')
+    async def plain(request):
+        return {'text': 'text'}
+
+    @aiohttp_tal.template('request.pt')
+    async def with_request(request):
+        return {}
+
+    app = web.Application()
+    aiohttp_tal.setup(
+        app, processes=1,
+        context_processors=[aiohttp_tal.request_processor],
+        loader={'plain.pt': '${text}', 'request.pt': '${request.path}'})
+
+    app.router.add_get('/plain', plain)
+    app.router.add_get('/request', with_request)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/plain')
+    assert 'text' == await resp.text()
+
+    resp = await client.get('/request')
+    assert 500 == resp.status
+
+
+async def test_render_in_process_unpicklable_filters(aiohttp_client):
+    app = web.Application()
+    aiohttp_tal.setup(app, processes=1, loader={},
+                      filters={'up': lambda value: value.upper()})
+
+    with pytest.warns(RuntimeWarning, match="Filter 'up' cannot be pickled"):
+        await aiohttp_client(app)
+
+
+async def test_process_renderer_unpicklable_context():
+    app = web.Application()
+    env = aiohttp_tal.setup(app, processes=1,
+                            loader={'tmpl.pt': '${value}'})
+    env.renderer.start(app, env)
+    try:
+        with pytest.raises(TypeError, match=(
+                "Context values of value cannot be pickled to render "
+                "template 'tmpl.pt' in a process")):
+            await env.renderer.render('tmpl.pt', [{'value': lambda: 1}])
+    finally:
+        env.renderer.shutdown()
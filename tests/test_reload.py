@@ -0,0 +1,254 @@
+import asyncio
+import os
+
+import chameleon
+import pytest
+from aiohttp import web
+
+import aiohttp_tal
+import aiohttp_tal.reload
+
+
+def write(path, text):
+    path.write_text(text)
+    # make the change visible to mtime based polling
+    stat = path.stat()
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def make_env(tmp_path):
+    write(tmp_path / 'base.pt',
+          '<html metal:define-macro="master">base '
+          '<div metal:define-slot="content"/></html>')
+    write(tmp_path / 'page.pt',
+          '<html metal:use-macro="load: base.pt">'
+          '<div metal:fill-slot="content">page</div></html>')
+    write(tmp_path / 'dynamic.pt',
+          '<html metal:use-macro="load: ${layout}"></html>')
+    write(tmp_path / 'other.pt', '<p>other</p>')
+    return aiohttp_tal.Environment(chameleon.PageTemplateLoader(
+        str(tmp_path), auto_reload=False))
+
+
+def test_invalidate_files(tmp_path):
+    env = make_env(tmp_path)
+    page = env.get_template('page.pt')
+    assert 'base' in page.render()
+    env.get_template('dynamic.pt').render(layout='base.pt')
+    other = env.get_template('other.pt')
+    other.render()
+
+    write(tmp_path / 'base.pt',
+          '<html metal:define-macro="master">new base '
+          '<div metal:define-slot="content"/></html>')
+    # without a watcher, changes are not seen
+    assert 'new base' not in env.get_template('page.pt').render()
+
+    names = env.invalidate_files([str(tmp_path / 'base.pt')])
+    assert ['dynamic.pt', 'page.pt'] == names
+    assert 'new base' in env.get_template('page.pt').render()
+    assert other is env.get_template('other.pt')
+
+
+def test_invalidate_files_mapping_loader():
+    env = aiohttp_tal.Environment({'tmpl.pt': '<p></p>'})
+    assert [] == env.invalidate_files(['tmpl.pt'])
+
+
+async def test_watcher_polling(tmp_path):
+    env = make_env(tmp_path)
+    assert '<p>other</p>' == env.get_template('other.pt').render()
+
+    watcher = aiohttp_tal.TemplateWatcher(env, interval=0.01,
+                                          use_watchfiles=False)
+    await watcher.start()
+    try:
+        await asyncio.sleep(0.05)
+        write(tmp_path / 'other.pt', '<p>changed</p>')
+        for i in range(100):
+            await asyncio.sleep(0.02)
+            if '<p>changed</p>' == env.get_template('other.pt').render():
+                break
+        else:
+            assert False, "template not reloaded"
+    finally:
+        await watcher.stop()
+
+
+async def test_watcher_invalidate_error(tmp_path, caplog):
+    env = make_env(tmp_path)
+    assert '<p>other</p>' == env.get_template('other.pt').render()
+    invalidate_files = env.invalidate_files
+    calls = []
+
+    def failing(paths):
+        calls.append(paths)
+        if len(calls) == 1:
+            raise FileNotFoundError(paths)
+        return invalidate_files(paths)
+
+    env.invalidate_files = failing
+    watcher = aiohttp_tal.TemplateWatcher(env, interval=0.01,
+                                          use_watchfiles=False)
+    await watcher.start()
+    try:
+        await asyncio.sleep(0.05)
+        write(tmp_path / 'other.pt', '<p>changed</p>')
+        for i in range(100):
+            await asyncio.sleep(0.02)
+            if calls:
+                break
+        write(tmp_path / 'other.pt', '<p>changed again</p>')
+        for i in range(100):
+            await asyncio.sleep(0.02)
+            if '<p>changed again</p>' == env.get_template(
+                    'other.pt').render():
+                break
+        else:
+            assert False, "template not reloaded"
+    finally:
+        await watcher.stop()
+    assert 'Failed to invalidate changed templates' in caplog.text
+
+
+async def test_setup_reload(aiohttp_client, tmp_path):
+    write(tmp_path / 'tmpl.pt', '<p>${text}</p>')
+    loader = chameleon.PageTemplateLoader(str(tmp_path), auto_reload=True)
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def func(request):
+        return {'text': 'text'}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader=loader, reload=True)
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    assert loader.kwargs['auto_reload'] is False
+    resp = await client.get('/')
+    assert '<p>text</p>' == await resp.text()
+
+
+def test_dependency_graph(tmp_path):
+    env = make_env(tmp_path)
+    (tmp_path / 'sub').mkdir()
+    write(tmp_path / 'sub' / 'base.pt',
+          '<html metal:define-macro="master"></html>')
+    write(tmp_path / 'sub' / 'page.pt',
+          '<html metal:use-macro="load: base.pt"></html>')
+    write(tmp_path / 'sub' / 'other.pt',
+          '<html metal:use-macro="load: ../page.pt"></html>')
+    write(tmp_path / 'unused.pt', '<p metal:define-macro="unused"></p>')
+
+    graph = env.dependency_graph()
+    assert {
+        'base.pt': frozenset(),
+        'page.pt': {'base.pt'},
+        'dynamic.pt': frozenset(),
+        'other.pt': frozenset(),
+        'unused.pt': frozenset(),
+        'sub/base.pt': frozenset(),
+        'sub/page.pt': {'sub/base.pt'},
+        'sub/other.pt': {'page.pt'},
+    } == graph.loads
+    assert {'dynamic.pt'} == graph.dynamic
+
+    assert {'page.pt', 'sub/other.pt', 'dynamic.pt'} == graph.dependents(
+        ['base.pt'])
+    assert [
+        ['base.pt', 'dynamic.pt', 'other.pt', 'sub/base.pt', 'unused.pt'],
+        ['page.pt', 'sub/page.pt'],
+        ['sub/other.pt'],
+    ] == graph.levels()
+    assert ['unused.pt'] == graph.unused_layouts()
+    assert [('base.pt', 2)] == graph.shared_layouts()
+
+
+def test_dependency_graph_load_boundary(tmp_path):
+    env = make_env(tmp_path)
+    write(tmp_path / 'other.pt', '<p>download: report.pdf</p>')
+    assert frozenset() == env.dependency_graph().loads['other.pt']
+
+
+def test_dependency_graph_cached(tmp_path, monkeypatch):
+    env = make_env(tmp_path)
+    assert frozenset() == env.dependency_graph().loads['other.pt']
+
+    write(tmp_path / 'other.pt', '<html metal:use-macro="load: base.pt">'
+          '</html>')
+    write(tmp_path / 'new.pt', '<html metal:use-macro="load: base.pt">'
+          '</html>')
+
+    def walk(path):
+        assert False, "search path walked again"
+
+    with monkeypatch.context() as m:
+        m.setattr(os, 'walk', walk)
+        graph = env.dependency_graph()
+    assert frozenset() == graph.loads['other.pt']
+    assert 'new.pt' not in graph.loads
+
+    env.invalidate_files([str(tmp_path / 'other.pt')])
+    graph = env.dependency_graph()
+    assert {'base.pt'} == graph.loads['other.pt']
+    assert {'base.pt'} == graph.loads['new.pt']
+
+
+async def test_precompile_order(tmp_path):
+    env = make_env(tmp_path)
+    results = await env.precompile()
+    assert ['base.pt', 'dynamic.pt', 'other.pt', 'page.pt'] == [
+        r.name for r in results]
+
+
+class FakeWatchfiles():
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.directories = None
+
+    async def awatch(self, *directories, stop_event):
+        self.directories = directories
+        yield self.changes
+        await stop_event.wait()
+
+
+async def test_watcher_watchfiles(tmp_path, monkeypatch):
+    env = make_env(tmp_path)
+    page = env.get_template('page.pt')
+    fake = FakeWatchfiles({(2, str(tmp_path / 'base.pt'))})
+    monkeypatch.setattr(aiohttp_tal.reload, 'watchfiles', fake)
+
+    watcher = aiohttp_tal.TemplateWatcher(env)
+    assert watcher.use_watchfiles
+    await watcher.start()
+    try:
+        for i in range(100):
+            await asyncio.sleep(0.01)
+            if page is not env.get_template('page.pt'):
+                break
+        else:
+            assert False, "dependent template not reloaded"
+    finally:
+        await watcher.stop()
+    assert (str(tmp_path),) == fake.directories
+
+
+async def test_watcher_watchfiles_installed(tmp_path):
+    pytest.importorskip('watchfiles')
+    env = make_env(tmp_path)
+    assert '<p>other</p>' == env.get_template('other.pt').render()
+
+    watcher = aiohttp_tal.TemplateWatcher(env)
+    await watcher.start()
+    try:
+        await asyncio.sleep(0.2)
+        write(tmp_path / 'other.pt', '<p>changed</p>')
+        for i in range(200):
+            await asyncio.sleep(0.02)
+            if '<p>changed</p>' == env.get_template('other.pt').render():
+                break
+        else:
+            assert False, "template not reloaded"
+    finally:
+        await watcher.stop()
@@ -0,0 +1,59 @@
+import chameleon
+from aiohttp import web
+
+import aiohttp_tal
+from aiohttp_tal.utils import ByteStream, render_bytes
+
+
+def test_byte_stream_encodes_chunks():
+    stream = ByteStream('utf-8', chunk_size=4)
+    for value in ('ab', 'cd', 'é'):
+        stream.append(value)
+    assert b'abcd' == stream.buffer
+
+    stream.flush()
+    assert 'abcdé'.encode('utf-8') == stream.buffer
+
+
+def test_byte_stream_drop_after_flush():
+    stream = ByteStream('utf-8', chunk_size=4)
+    stream.append('é')
+    mark = len(stream)
+    for value in ('abcd', 'efgh', 'i'):
+        stream.append(value)
+    del stream[mark:]
+    stream.append('j')
+    stream.flush()
+
+    assert 'éj'.encode('utf-8') == stream.buffer
+    assert 2 == len(stream)
+
+
+def test_render_bytes_on_error():
+    template = chameleon.PageTemplate(
+        '<div tal:on-error="string:error">'
+        '<p tal:repeat="i range(3000)">${i}</p>${1 / 0}'
+        '</div><p>é</p>')
+
+    body = render_bytes(template, 'latin-1')
+    assert isinstance(body, bytearray)
+    assert template.render().encode('latin-1') == body
+    assert body.startswith(b'<div>error</div>')
+
+
+async def test_render_template_encoding(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt', encoding='latin-1')
+    async def func(request):
+        return {'text': 'café'}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '<p>${text}</p>'})
+
+    app.router.add_route('*', '/', func)
+
+    client = await aiohttp_client(app)
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 'text/html; charset=latin-1' == resp.headers['Content-Type']
+    assert '<p>café</p>'.encode('latin-1') == await resp.read()
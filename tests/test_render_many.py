@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import aiohttp_tal
+from aiohttp_tal.exceptions import TemplateNotFound
+
+
+def make_env(**kwargs):
+    env = aiohttp_tal.Environment({'tmpl.pt': '<p>${greeting} ${name}</p>'},
+                                  **kwargs)
+    env.globals['greeting'] = 'Hello'
+    return env
+
+
+async def test_render_many():
+    env = make_env()
+    with ThreadPoolExecutor(4) as executor:
+        results = [r async for r in env.render_many(
+            'tmpl.pt', ({'name': i} for i in range(100)), executor=executor,
+            chunk_size=7)]
+    assert ['<p>Hello {}</p>'.format(i) for i in range(100)] == results
+
+
+async def test_render_many_encoding():
+    env = make_env()
+    results = [r async for r in env.render_many(
+        'tmpl.pt', [{'name': 'é'}], encoding='latin-1')]
+    assert ['<p>Hello é</p>'.encode('latin-1')] == results
+
+
+async def test_render_many_bounds_pending():
+    env = make_env()
+    consumed = []
+
+    def contexts():
+        for i in range(1000):
+            consumed.append(i)
+            yield {'name': i}
+
+    results = env.render_many('tmpl.pt', contexts(), chunk_size=10,
+                              max_pending=3)
+    assert '<p>Hello 0</p>' == await results.__anext__()
+    # three chunks in flight and one more submitted once the first is done
+    assert 40 == len(consumed)
+    await results.aclose()
+
+
+async def test_render_many_error():
+    env = make_env()
+    results = env.render_many('tmpl.pt', [{'name': 1}, {}], chunk_size=1)
+    assert '<p>Hello 1</p>' == await results.__anext__()
+    with pytest.raises(NameError):
+        await results.__anext__()
+
+    with pytest.raises(TemplateNotFound):
+        await env.render_many('missing.pt', []).__anext__()
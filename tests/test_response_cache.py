@@ -0,0 +1,203 @@
+from unittest import mock
+
+from aiohttp import web
+
+import aiohttp_tal
+
+
+async def test_template_cache(aiohttp_client):
+    calls = []
+    cache = aiohttp_tal.ResponseCache(ttl=60)
+
+    @aiohttp_tal.template('tmpl.pt', cache=cache, status=201)
+    async def func(request):
+        calls.append(request.path_qs)
+        return {'text': len(calls)}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '<p>${text}</p>'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    for i in range(2):
+        resp = await client.get('/')
+        assert 201 == resp.status
+        assert 'text/html; charset=utf-8' == resp.headers['Content-Type']
+        assert '<p>1</p>' == await resp.text()
+    resp = await client.get('/?page=2')
+    assert '<p>2</p>' == await resp.text()
+
+    assert ['/', '/?page=2'] == calls
+    assert 2 == len(cache)
+
+
+async def test_template_cache_key(aiohttp_client):
+    cache = aiohttp_tal.ResponseCache()
+
+    def cache_key(request):
+        if 'nocache' in request.query:
+            return None
+        return 'page'
+
+    @aiohttp_tal.template('tmpl.pt', cache=cache, cache_key=cache_key)
+    async def func(request):
+        return {'text': request.query.get('text', '')}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '${text}'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/?text=a')
+    assert 'a' == await resp.text()
+    resp = await client.get('/?text=b')
+    assert 'a' == await resp.text()
+    resp = await client.get('/?text=c&nocache')
+    assert 'c' == await resp.text()
+
+
+async def test_template_cache_unsafe_methods(aiohttp_client):
+    calls = []
+    cache = aiohttp_tal.ResponseCache()
+
+    @aiohttp_tal.template('tmpl.pt', cache=cache,
+                          cache_key=lambda request: 'page')
+    async def func(request):
+        calls.append(request.method)
+        return {'text': len(calls)}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '${text}'})
+
+    app.router.add_route('*', '/', func)
+    client = await aiohttp_client(app)
+
+    for i in range(2):
+        resp = await client.post('/')
+        assert str(i + 1) == await resp.text()
+    assert 0 == len(cache)
+    resp = await client.get('/')
+    assert '3' == await resp.text()
+    resp = await client.post('/')
+    assert '4' == await resp.text()
+    resp = await client.get('/')
+    assert '3' == await resp.text()
+    assert ['POST', 'POST', 'GET', 'POST'] == calls
+    assert aiohttp_tal.cache.default_cache_key(
+        mock.Mock(method='POST')) is None
+
+
+async def test_template_cache_skips_context_processors(aiohttp_client):
+    calls = []
+    cache = aiohttp_tal.ResponseCache()
+
+    async def processor(request):
+        calls.append(request.path)
+        return {'user': 'user'}
+
+    @aiohttp_tal.template('tmpl.pt', cache=cache)
+    async def func(request):
+        return {}
+
+    class View(web.View):
+
+        @aiohttp_tal.template('tmpl.pt', cache=cache)
+        async def get(self):
+            return {}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '${user}'},
+                      context_processors=[processor])
+
+    app.router.add_get('/', func)
+    app.router.add_view('/view', View)
+    client = await aiohttp_client(app)
+
+    for path in ('/', '/view'):
+        for i in range(3):
+            resp = await client.get(path)
+            assert 'user' == await resp.text()
+    assert ['/', '/view'] == calls
+
+
+async def test_render_template_cache(aiohttp_client):
+    cache = aiohttp_tal.ResponseCache()
+
+    async def func(request):
+        return aiohttp_tal.render_template(
+            'tmpl.pt', request, {'text': request.query['text']},
+            cache=cache, cache_key=request.query['key'])
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '${text}'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/?key=1&text=a')
+    assert 'a' == await resp.text()
+    resp = await client.get('/?key=1&text=b')
+    assert 'a' == await resp.text()
+    resp = await client.get('/?key=2&text=b')
+    assert 'b' == await resp.text()
+
+
+
+async def test_render_template_default_cache_key(aiohttp_client):
+    cache = aiohttp_tal.ResponseCache()
+
+    async def func(request):
+        return aiohttp_tal.render_template(
+            'tmpl.pt', request, {'text': request.match_info['id']},
+            cache=cache)
+
+    async def func_async(request):
+        return await aiohttp_tal.render_template_async(
+            'tmpl.pt', request, {'text': request.match_info['id']},
+            cache=cache)
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '${text}'})
+
+    app.router.add_get('/item/{id}', func)
+    app.router.add_get('/other/{id}', func_async)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/item/1')
+    assert '1' == await resp.text()
+    resp = await client.get('/item/2')
+    assert '2' == await resp.text()
+    resp = await client.get('/other/3')
+    assert '3' == await resp.text()
+    assert 3 == len(cache)
+
+def test_cache_ttl():
+    cache = aiohttp_tal.ResponseCache(ttl=10)
+    with mock.patch('time.monotonic', return_value=100):
+        cache.set('key', web.Response(body=b'body'))
+        assert b'body' == cache.get('key').body
+    with mock.patch('time.monotonic', return_value=111):
+        assert cache.get('key') is None
+    assert 0 == len(cache)
+    assert 0 == cache.size
+
+
+def test_cache_max_size():
+    cache = aiohttp_tal.ResponseCache(max_size=10)
+    cache.set('a', web.Response(body=b'aaaa'))
+    cache.set('b', web.Response(body=b'bbbb'))
+    cache.get('a')
+    cache.set('c', web.Response(body=b'cccc'))  # evicts b
+    cache.set('d', web.Response(body=b'd' * 11))  # too big
+
+    assert cache.get('b') is None
+    assert cache.get('d') is None
+    assert b'aaaa' == cache.get('a').body
+    assert 8 == cache.size
+
+    cache.invalidate('a')
+    assert 4 == cache.size
+    cache.invalidate()
+    assert 0 == len(cache)
@@ -0,0 +1,62 @@
+import chameleon
+from aiohttp import web
+
+import aiohttp_tal
+from aiohttp_tal.static import fingerprint, StaticManifest
+
+
+def test_fingerprint():
+    assert 'style.abc.css' == fingerprint('style.css', 'abc')
+    assert 'css/style.abc.css' == fingerprint('css/style.css', 'abc')
+    assert 'LICENSE.abc' == fingerprint('LICENSE', 'abc')
+
+
+def test_manifest(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'style.css').write_text('body {}')
+    (tmp_path / '.hidden').write_text('')
+    manifest = StaticManifest(tmp_path)
+    manifest.scan()
+
+    hashed = manifest.get('css/style.css')
+    assert hashed.startswith('css/style.')
+    assert hashed.endswith('.css')
+    assert hashed != 'css/style.css'
+    assert 'missing.js' == manifest.get('missing.js')
+    assert {'css/style.css', hashed} == set(manifest.files)
+
+    (tmp_path / 'css' / 'style.css').write_text('body {color: red}')
+    manifest.scan()
+    assert hashed != manifest.get('css/style.css')
+
+
+async def test_setup_static(aiohttp_client, tmp_path):
+    (tmp_path / 'style.css').write_text('body {}')
+
+    @aiohttp_tal.template('tmpl.pt')
+    async def index(request):
+        return {}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={
+        'tmpl.pt': chameleon.PageTemplate("${static('/style.css')}")})
+    aiohttp_tal.setup_static(app, '/static/', tmp_path)
+    app.router.add_get('/', index)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    url = await resp.text()
+    assert url.startswith('/static/style.')
+    assert url != '/static/style.css'
+
+    resp = await client.get(url)
+    assert 200 == resp.status
+    assert 'body {}' == await resp.text()
+    assert 'immutable' in resp.headers['Cache-Control']
+
+    resp = await client.get('/static/style.css')
+    assert 200 == resp.status
+    assert 'Cache-Control' not in resp.headers
+
+    resp = await client.get('/static/../test_static.py')
+    assert 404 == resp.status
@@ -0,0 +1,151 @@
+import aiohttp
+import pytest
+from aiohttp import web
+
+import aiohttp_tal
+from aiohttp_tal.utils import OutputStream, render_into
+
+
+def test_output_stream_flushes_chunks():
+    chunks = []
+    stream = OutputStream(chunks.append, 4, 'utf-8')
+
+    for value in ('ab', 'cd', 'é'):
+        stream.append(value)
+    assert [b'abcd'] == chunks
+    assert 3 == len(stream)
+
+    stream.flush()
+    assert [b'abcd', 'é'.encode('utf-8')] == chunks
+
+
+def test_output_stream_drop_after_flush():
+    chunks = []
+    stream = OutputStream(chunks.append, 4, 'utf-8')
+    stream.append('abcd')
+    mark = len(stream)
+    stream.append('e')
+    del stream[mark:]
+    stream.flush()
+
+    assert [b'abcd'] == chunks
+
+
+async def test_stream_template(aiohttp_client):
+
+    async def func(request):
+        return await aiohttp_tal.stream_template(
+            'tmpl.pt', request, {'items': range(1000)}, chunk_size=100)
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={
+        'tmpl.pt': '<ul><li tal:repeat="i items">${i}</li></ul>'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    assert 'chunked' == resp.headers['Transfer-Encoding']
+    assert 'text/html; charset=utf-8' == resp.headers['Content-Type']
+    txt = await resp.text()
+    expected = '<ul>{}</ul>'.format(
+        '\n'.join('<li>{}</li>'.format(i) for i in range(1000)))
+    assert expected == txt
+
+
+async def test_template_stream(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt', stream=True, status=201)
+    async def func(request):
+        return {'text': 'text'}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '<p>${text}</p>'})
+
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 201 == resp.status
+    assert '<p>text</p>' == await resp.text()
+
+
+def test_render_after_render_into():
+    env = aiohttp_tal.Environment({'tmpl.pt': '<p>${text}</p>'})
+    template = env.get_template('tmpl.pt')
+
+    chunks = []
+    stream = OutputStream(chunks.append, 1, 'utf-8')
+    render_into(template, stream, text='text')
+    assert b'<p>text</p>' == b''.join(chunks)
+
+    assert '<p>text</p>' == template.render(text='text')
+
+
+async def test_stream_template_error_before_first_chunk(aiohttp_client):
+
+    @aiohttp_tal.template('tmpl.pt', stream=True)
+    async def func(request):
+        return {}
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={'tmpl.pt': '<p>${1 / 0}</p>'})
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 500 == resp.status
+
+
+async def test_stream_template_error_after_first_chunk(aiohttp_client,
+                                                       caplog):
+
+    async def func(request):
+        return await aiohttp_tal.stream_template(
+            'tmpl.pt', request, {'items': range(100)}, chunk_size=100)
+
+    app = web.Application()
+    aiohttp_tal.setup(app, loader={
+        'tmpl.pt': '<ul><li tal:repeat="i items">${i}</li></ul>${1 / 0}'})
+    app.router.add_get('/', func)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 200 == resp.status
+    with pytest.raises(aiohttp.ClientPayloadError):
+        await resp.text()
+    assert ["Error streaming template 'tmpl.pt'"] == [
+        r.getMessage() for r in caplog.records if r.name == 'aiohttp_tal']
+
+
+async def test_stream_template_context_error(aiohttp_client, caplog):
+
+    async def fail():
+        raise ValueError
+
+    @aiohttp_tal.template('tmpl.pt', stream=True)
+    async def func(request):
+        return {'value': fail()}
+
+    @aiohttp_tal.template('tmpl.pt', stream=True, preload=True)
+    async def preload(request):
+        return {'value': fail()}
+
+    app = web.Application()
+    app['static_root_url'] = '/static'
+    aiohttp_tal.setup(app, loader={
+        'tmpl.pt': '<link href="${static(\'main.css\')}"/>${value}'})
+    app.router.add_get('/', func)
+    app.router.add_get('/preload', preload)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/')
+    assert 500 == resp.status
+
+    # headers are sent before awaiting the context
+    resp = await client.get('/preload')
+    assert 200 == resp.status
+    assert '</static/main.css>; rel=preload; as=style' == resp.headers['Link']
+    with pytest.raises(aiohttp.ClientPayloadError):
+        await resp.text()